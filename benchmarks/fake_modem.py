@@ -0,0 +1,183 @@
+# MIT License
+#
+# Copyright (c) [Year] [Your Name or Handle]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import io
+import json
+import tarfile
+import threading
+from urllib.parse import urlsplit, unquote
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+URL_FILTER_OBJECT = 'Device.Firewall.X_LANTIQ_COM_URLFilter'
+
+def _host_mac(index):
+    return f"02:00:00:{(index >> 16) & 0xff:02x}:{(index >> 8) & 0xff:02x}:{index & 0xff:02x}"
+
+class FakeModemTransport:
+    """
+    An in-process C4000 that speaks the same cgi_get / cgi_set / cgi_action
+    protocol as the real modem. It never sleeps; instead it counts every
+    request and byte, and keeps a virtual clock that sleep() advances and
+    time() reads, so the rate limiter sees the waits it asked for.
+    sleep_seconds is how far that clock moved: the waiting a real modem costs.
+    """
+    def __init__(self, hosts=10, rules=0, ghost_rules=()):
+        self.headers = CaseInsensitiveDict()
+        self.cookies = {}
+        self.hosts = [
+            {'HostName': f"host-{i:04d}", 'IPAddress': f"10.{(i >> 8) & 0xff}.{i & 0xff}.10",
+             'PhysAddress': _host_mac(i), 'Active': 'true', 'InterfaceType': 'Ethernet',
+             'AddressSource': 'DHCP', 'LeaseTimeRemaining': '86400'}
+            for i in range(hosts)
+        ]
+        self.rules = {}
+        self.next_rule_num = 1
+        for i in range(rules):
+            self.add_rule(self.hosts[i % hosts]['PhysAddress'] if hosts else '', f"site-{i:04d}.example")
+        self.ghost_rules = set(ghost_rules)
+        self._lock = threading.Lock() # ModemControl may issue reads concurrently
+        self._seen = threading.local() # Clock value each thread last saw
+        self.clock = 0.0
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.gets = 0
+        self.sets = 0
+        self.posts = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._clock_start = self.clock
+
+    @property
+    def sleep_seconds(self):
+        return self.clock - self._clock_start
+
+    def add_rule(self, mac, url):
+        self.rules[self.next_rule_num] = {'MACAddress': mac, 'URL': f"http://{url}"}
+        self.next_rule_num += 1
+
+    # --- Object renderers ---
+
+    def _render_hosts(self):
+        return {'Objects': [
+            {'ObjName': f"Device.Hosts.Host.{i}.",
+             'Param': [{'ParamName': k, 'ParamValue': v} for k, v in host.items()]}
+            for i, host in enumerate(self.hosts, 1)
+        ]}
+
+    def _render_rules(self):
+        objects = [{'ObjName': f"{URL_FILTER_OBJECT}.", 'Param': [{'ParamName': 'Enable', 'ParamValue': 'true'}]}]
+        for num, rule in sorted(self.rules.items()):
+            objects.append({
+                'ObjName': f"{URL_FILTER_OBJECT}.Rule.{num}.",
+                'Param': [{'ParamName': k, 'ParamValue': v} for k, v in rule.items()],
+            })
+        return {'Objects': objects}
+
+    def _render_device_info(self):
+        return {'Objects': [{'ObjName': 'Device.DeviceInfo.', 'Param': [
+            {'ParamName': 'ModelName', 'ParamValue': 'C4000BZ'},
+            {'ParamName': 'SerialNumber', 'ParamValue': 'FAKE0001'},
+            {'ParamName': 'SoftwareVersion', 'ParamValue': 'CBZ001-W21.1.0'},
+            {'ParamName': 'UpTime', 'ParamValue': str(1000 + self.gets)},
+        ]}]}
+
+    @staticmethod
+    def _config_archive():
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+            for name, body in [('config/db.xml', b'<db>' + b'<row/>' * 2000 + b'</db>'), ('config/version', b'1\n')]:
+                info = tarfile.TarInfo(name)
+                info.size = len(body)
+                tar.addfile(info, io.BytesIO(body))
+        return buffer.getvalue()
+
+    # --- Transport interface ---
+
+    def _response(self, body, status=200, headers=None):
+        response = requests.models.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers or {})
+        response.encoding = 'utf-8'
+        response._content = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        response._content_consumed = True
+        self.bytes_in += len(response._content)
+        return response
+
+    def request(self, method, url, params=None, data=None, files=None, **kwargs):
+        with self._lock:
+            return self._handle(method, url, params, data, files)
+
+    def _handle(self, method, url, params, data, files):
+        endpoint = urlsplit(url).path.rsplit('/', 1)[-1]
+        self.bytes_out += len(json.dumps(params or {})) + len(json.dumps(data or {}))
+
+        if method == 'GET':
+            self.gets += 1
+            renderers = {
+                'Device.Hosts.Host': self._render_hosts,
+                URL_FILTER_OBJECT: self._render_rules,
+                'Device.DeviceInfo': self._render_device_info,
+            }
+            renderer = renderers.get((params or {}).get('Object'))
+            return self._response(renderer() if renderer else {'Objects': []})
+
+        if endpoint == 'cgi_set' and files is None:
+            self.sets += 1
+            if data.get('Operation') == 'Add':
+                self.add_rule(data.get('MACAddress', ''), unquote(data['URL']).replace('http://', ''))
+            elif data.get('Operation') == 'Del':
+                rule_num = int(data['Object'].split('.')[-2])
+                if rule_num not in self.ghost_rules:
+                    self.rules.pop(rule_num, None)
+            return self._response({})
+
+        self.posts += 1
+        if files is not None:
+            for _, (_, handle, _) in files.items():
+                self.bytes_out += len(handle.read())
+            return self._response({})
+        if data and 'username' in data:
+            self.cookies['Session-Id'] = 'fake-session'
+            return self._response({}, headers={'Set-Cookie': 'Session-Id=fake-session; path=/'})
+        if data and data.get('Action') == 'BackUp':
+            return self._response(self._config_archive())
+        return self._response({})
+
+    def time(self):
+        with self._lock:
+            self._seen.now = self.clock
+            return self.clock
+
+    def sleep(self, seconds):
+        # Threads sleeping side by side overlap: each wakes 'seconds' after the
+        # time it last saw, and the clock only moves to the latest wake-up.
+        with self._lock:
+            start = getattr(self._seen, 'now', self.clock)
+            self.clock = max(self.clock, start + max(seconds, 0.0))
+            self._seen.now = self.clock
+
+    def close(self):
+        pass
@@ -0,0 +1,222 @@
+# MIT License
+#
+# Copyright (c) [Year] [Your Name or Handle]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+"""
+Drives every CLI action against the in-process fake modem and reports, per
+operation and table size: GETs, SETs, other POSTs, bytes, time spent
+waiting (on the fake modem's virtual clock), CPU time and wall time.
+Results are written as JSON so runs from different commits can be compared
+with --compare.
+
+    python benchmarks/run_benchmarks.py --sizes 10,100 --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import tarfile
+import argparse
+import builtins
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from c4000_lib.core import ModemControl
+from c4000_lib.features.device_listing import DeviceListingFeature
+from c4000_lib.features.url_blocking import URLBlockingFeature
+from c4000_lib.features.config import ConfigFeature, BACKUP_DIR
+from c4000_lib.features.ghost_rules import GhostRuleStore
+from c4000_lib.features.backup_index import BackupIndex
+from benchmarks.fake_modem import FakeModemTransport
+
+DEFAULT_SIZES = [10, 100, 1000]
+METRICS = ['gets', 'sets', 'posts', 'bytes_in', 'bytes_out', 'sleep_seconds', 'cpu_seconds', 'wall_seconds']
+
+def _policy(modem, count, existing_ratio=0.9):
+    """A rules list where most entries already exist on the modem, like re-applying a policy."""
+    existing = [(h['PhysAddress'], f"site-{i:04d}.example") for i, h in
+                zip(range(int(count * existing_ratio)), modem.hosts * (count // max(len(modem.hosts), 1) + 1))]
+    new = [(modem.hosts[i % len(modem.hosts)]['PhysAddress'], f"new-{i:04d}.example")
+           for i in range(count - len(existing))]
+    return existing + new
+
+def _write_archive(path, size, version):
+    """Writes a backup-like archive with 'size' members; a tenth of them depend on 'version'."""
+    with tarfile.open(path, mode='w:gz') as tar:
+        for i in range(size):
+            body = f"<row id='{i}' value='{version if i % 10 == 0 else 0}'/>\n".encode('utf-8') * 50
+            info = tarfile.TarInfo(f"config/table-{i:04d}.xml")
+            info.size = len(body)
+            tar.addfile(info, io.BytesIO(body))
+
+def _seed_ghosts(features, count):
+    """Makes the first 'count' rules undeletable and records them in a memory-only ghost store."""
+    features['modem'].ghost_rules = set(range(1, count + 1))
+    features['url'].ghost_store = GhostRuleStore(path=None)
+    rules, _ = features['url'].get_rules()
+    serial = features['url']._modem_serial()
+    for rule in rules:
+        if int(rule['rule_num']) in features['modem'].ghost_rules:
+            features['url'].ghost_store.record(serial, rule)
+
+def _seed_shared_domain(features):
+    """Blocks one domain separately for every host, so compaction has work to do."""
+    for host in features['modem'].hosts:
+        features['modem'].add_rule(host['PhysAddress'], "shared.example")
+
+def _seed_diff(features, size):
+    """Writes two archives that differ in a tenth of their members."""
+    features['archives'] = []
+    for version in (1, 2):
+        path = f"diff-{size}-{version}.tar.gz"
+        _write_archive(path, size, version)
+        features['archives'].append(path)
+
+def _seed_verify(features, size, count=4):
+    """Writes 'count' archives to the backup directory; a memory-only index forces a full check."""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    for version in range(count):
+        _write_archive(os.path.join(BACKUP_DIR, f"verify-{size}-{version}.tar.gz"), size, version)
+    features['config'].index = BackupIndex(path=None)
+
+def _operations(size):
+    """
+    Yields (name, action, setup) triples; action(features) runs one CLI action.
+    setup(features), if not None, prepares state first and is not measured.
+    Rule-changing actions touch a tenth of the table, like a typical policy update.
+    """
+    batch = max(size // 10, 1)
+    yield 'device list', lambda f: f['device'].list_devices(), None
+    yield 'url list', lambda f: f['url'].list_rules(), None
+    yield 'url add', lambda f: f['url'].add(_policy(f['modem'], batch)), None
+    yield 'url remove', lambda f: f['url'].remove(
+        [(f['modem'].hosts[i % len(f['modem'].hosts)]['PhysAddress'], f"site-{i:04d}.example") for i in range(batch)]), None
+    yield 'url remove-id', lambda f: f['url'].remove_by_id(size // 2), None
+    yield 'url remove-all', lambda f: f['url'].remove_all(), None
+    yield 'url compact', lambda f: f['url'].compact(), _seed_shared_domain
+    yield 'url ghosts', lambda f: f['url'].ghosts(probe=True), lambda f: _seed_ghosts(f, batch)
+    yield 'config backup', lambda f: f['config'].backup(), None
+    yield 'config list', lambda f: f['config'].list_backups(), None
+    yield 'config restore', lambda f: f['config'].restore(), None
+    yield 'config diff', lambda f: f['config'].diff(*f['archives']), lambda f: _seed_diff(f, size)
+    yield 'config verify', lambda f: f['config'].verify(), lambda f: _seed_verify(f, size)
+
+def run_operation(name, size, action, setup=None, read_concurrency=1):
+    """Runs one action against a fresh fake modem with 'size' hosts and rules."""
+    modem = FakeModemTransport(hosts=size, rules=size)
+    control = ModemControl('fake-modem', 'bench', 'bench', min_interval=2.0, transport=modem,
+                           read_concurrency=read_concurrency)
+    features = {'modem': modem}
+    features['device'] = DeviceListingFeature(control)
+    features['url'] = URLBlockingFeature(control, features['device'])
+    features['config'] = ConfigFeature(control)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        control.login()
+        if setup:
+            setup(features)
+            control.invalidate_cache() # Setup reads must not warm the measured run
+        modem.reset_counters()
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        action(features)
+        cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+    return {
+        'operation': name, 'size': size,
+        'gets': modem.gets, 'sets': modem.sets, 'posts': modem.posts,
+        'bytes_in': modem.bytes_in, 'bytes_out': modem.bytes_out,
+        'sleep_seconds': round(modem.sleep_seconds, 3),
+        'cpu_seconds': round(cpu, 4), 'wall_seconds': round(wall, 4),
+    }
+
+def run_all(sizes, only=None, read_concurrency=1):
+    results = []
+    for size in sizes:
+        for name, action, setup in _operations(size):
+            if only and name not in only:
+                continue
+            result = run_operation(name, size, action, setup, read_concurrency)
+            print(f"{name:<16} size={size:<6} GET={result['gets']:<6} SET={result['sets']:<6} "
+                  f"sleep={result['sleep_seconds']:<9} cpu={result['cpu_seconds']}s", file=sys.stderr)
+            results.append(result)
+    return results
+
+def compare(baseline, results):
+    """Prints the change of every metric against a baseline result file."""
+    base = {(r['operation'], r['size']): r for r in baseline['results']}
+    print(f"{'Operation':<16} {'Size':<6} {'Metric':<14} {'Baseline':>12} {'Current':>12} {'Change':>9}")
+    print(f"{'-'*16} {'-'*6} {'-'*14} {'-'*12} {'-'*12} {'-'*9}")
+    for r in results:
+        old = base.get((r['operation'], r['size']))
+        if not old:
+            continue
+        for metric in METRICS:
+            if old[metric] == r[metric]:
+                continue
+            change = f"{(r[metric] - old[metric]) / old[metric] * 100:+.0f}%" if old[metric] else "new"
+            print(f"{r['operation']:<16} {r['size']:<6} {metric:<14} {old[metric]:>12} {r[metric]:>12} {change:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every c4000_control action against an in-process fake modem.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Comma-separated host/rule table sizes. Default: 10,100,1000.")
+    parser.add_argument("--only", action="append", help="Only run this operation, e.g. 'url add' (may be repeated).")
+    parser.add_argument("--read-concurrency", type=int, default=1, help="Read concurrency passed to ModemControl. Default: 1.")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare against a previous JSON results file.")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    # Backups, ghost rules etc. are written to the working directory, so keep them out of the tree.
+    workdir = tempfile.mkdtemp(prefix="c4000-bench-")
+    cwd = os.getcwd()
+    original_input = builtins.input
+    builtins.input = lambda prompt='': 'y' # Confirm restores without a human
+    try:
+        os.chdir(workdir)
+        results = run_all(sizes, args.only, args.read_concurrency)
+    finally:
+        os.chdir(cwd)
+        builtins.input = original_input
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {'python': sys.version.split()[0], 'read_concurrency': args.read_concurrency, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(json.load(f), results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
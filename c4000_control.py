@@ -27,10 +27,13 @@
 # and executes it.
 
 import sys
+import multiprocessing
 from c4000_lib import cli
 
 if __name__ == "__main__":
     # Ensure the library is in the path, especially when run from weird locations
     # (This is good practice for self-contained script/library setups)
     sys.path.insert(0, ".")
+    # 'config verify' uses worker processes; needed for frozen Windows builds.
+    multiprocessing.freeze_support()
     cli.main()
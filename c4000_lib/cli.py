@@ -23,16 +23,31 @@
 import argparse
 import sys
 import os
+import shlex
 import traceback
+import contextlib
+import sqlite3
 
 from . import utils
+from . import planning
+from . import output
 from .core import ModemControl, ModemError
+from .transport import HTTPTransport, RecordingTransport, ReplayTransport
 from .features.device_listing import DeviceListingFeature
+from .features.device_history import DeviceHistoryStore
 from .features.url_blocking import URLBlockingFeature
-from .features.config import ConfigFeature
+from .features.config import ConfigFeature, DEFAULT_MAX_BACKUP_AGE_DAYS
 
-def parse_rules_from_file(filename):
-    """Parses a device,url file and returns a list of tuples."""
+FORMAT_HELP = "Output format: table (default), json, ndjson or csv. Machine formats stream raw fields."
+DEFAULT_GROUPS_FILE = "device-groups.txt"
+PLAN_HELP = "Show the changes, request counts and estimated wall time without writing anything."
+COMPACT_HELP = "Use one all-devices rule for a domain blocked on every known device (and expand it again when a device is exempted)."
+
+def parse_rules_from_file(filename, groups_file=None):
+    """
+    Parses a device,url file and returns a list of tuples.
+    '@group' devices are expanded (see expand_device_groups). Returns None on error.
+    """
     rules = []
     if not os.path.exists(filename):
         print(f"Error: Rules file not found at '{filename}'", file=sys.stderr)
@@ -46,10 +61,105 @@ def parse_rules_from_file(filename):
                 rules.append((device, url))
             except ValueError:
                 print(f"Warning: Skipping malformed line #{i} in '{filename}': {line}", file=sys.stderr)
-    return rules
+    return expand_device_groups(rules, groups_file)
 
-def main():
-    """The main entry point for the CLI application."""
+def parse_groups_file(filename):
+    """
+    Parses a device groups file: one 'name = id1, id2, ...' line per group.
+    Returns {name: [identifiers]} (names lowercased), or None on error.
+    """
+    groups = {}
+    if not os.path.exists(filename):
+        print(f"Error: Device groups file not found at '{filename}'", file=sys.stderr)
+        return None
+    with open(filename, 'r') as f:
+        for i, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'): continue
+            name, sep, members = line.partition('=')
+            name = name.strip().lstrip('@').lower()
+            if not sep or not name:
+                print(f"Warning: Skipping malformed line #{i} in '{filename}': {line}", file=sys.stderr)
+                continue
+            groups[name] = [m.strip() for m in members.split(',') if m.strip()]
+    return groups
+
+def expand_device_groups(rules, groups_file=None):
+    """
+    Replaces every '@group' device in (device, url) rules with one rule per
+    group member, keeping order and dropping exact duplicates. The groups file
+    is only read if a group is referenced.
+    Returns the expanded list, or None on error.
+    """
+    if not any(device.startswith('@') for device, url in rules):
+        return list(dict.fromkeys(rules))
+
+    groups = parse_groups_file(groups_file or DEFAULT_GROUPS_FILE)
+    if groups is None:
+        return None
+
+    expanded = []
+    for device, url in rules:
+        if not device.startswith('@'):
+            expanded.append((device, url))
+            continue
+        members = groups.get(device[1:].lower())
+        if members is None:
+            print(f"Error: Unknown device group '{device}'.", file=sys.stderr)
+            return None
+        expanded.extend((member, url) for member in members)
+    return list(dict.fromkeys(expanded))
+
+def _positive_int(text):
+    """argparse type for counts that must be at least 1."""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer '{text}'")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+def _parse_time_of_day(text):
+    """'HH:MM' -> minute of day. '24:00' is accepted as midnight."""
+    hours, minutes = (int(part) for part in text.strip().split(':'))
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or (hours == 24 and minutes):
+        raise ValueError(f"invalid time '{text.strip()}'")
+    return (hours * 60 + minutes) % (24 * 60)
+
+def parse_schedule_file(filename, groups_file=None):
+    """
+    Parses a 'HH:MM-HH:MM,device,url' schedule file. A window whose end is
+    before its start runs past midnight.
+    Returns a list of (start_minute, end_minute, device, url) with '@group'
+    devices expanded, or None on error.
+    """
+    if not os.path.exists(filename):
+        print(f"Error: Schedule file not found at '{filename}'", file=sys.stderr)
+        return None
+
+    spans = {}
+    with open(filename, 'r') as f:
+        for i, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'): continue
+            try:
+                span, device, url = [item.strip() for item in line.split(',', 2)]
+                start, end = (_parse_time_of_day(part) for part in span.split('-'))
+                spans.setdefault((start, end), []).append((device, url))
+            except ValueError:
+                print(f"Warning: Skipping malformed line #{i} in '{filename}': {line}", file=sys.stderr)
+
+    entries = []
+    for (start, end), rules in spans.items():
+        rules = expand_device_groups(rules, groups_file)
+        if rules is None:
+            return None
+        entries.extend((start, end, device, url) for device, url in rules)
+    return entries
+
+def build_parser():
+    """Builds the argument parser shared by the command line and batch scripts."""
     parser = argparse.ArgumentParser(
         description="A CLI tool to control and query a C4000-series modem.",
         formatter_class=argparse.RawTextHelpFormatter
@@ -58,115 +168,320 @@ def main():
     parser.add_argument("--debug", action="store_true", help="Enable detailed debug output.")
     parser.add_argument("--wait", action="store_true", help="Wait for user input before exiting.")
     parser.add_argument("--delay", type=float, default=2.0, help="Minimum interval between modem requests. Default: 2.0.")
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record", metavar="CASSETTE", help="Record all modem traffic (credentials redacted) to a cassette file.")
+    cassette_group.add_argument("--replay", metavar="CASSETTE", help="Answer requests from a recorded cassette instead of the modem.")
+    parser.add_argument("--read-concurrency", type=int, default=1, help="Maximum independent reads sent at once (writes are always serialized). Default: 1.")
+    parser.add_argument("--history-db", metavar="FILE", help="Record every device list in this SQLite file and use it to resolve offline devices.")
+    parser.add_argument("--groups-file", metavar="FILE", help=f"Device groups ('name = id1, id2') for '@name' targets. Default: {DEFAULT_GROUPS_FILE}.")
+    parser.add_argument("--replay-scale", type=float, default=0.0, help="Multiply recorded latency and all delays by this factor when replaying. Default: 0 (no waiting).")
 
     feature_subparsers = parser.add_subparsers(dest="feature", required=True, help="Feature to interact with.")
 
     # --- DEVICE ---
     parser_device = feature_subparsers.add_parser("device", help="Commands for listing network devices.")
     device_action_parsers = parser_device.add_subparsers(dest="action", required=True, help="Action for the 'device' feature.")
-    device_action_parsers.add_parser("list", help="List all known devices on the network.")
+    parser_device_list = device_action_parsers.add_parser("list", help="List all known devices on the network.")
+    parser_device_list.add_argument("--format", choices=output.FORMATS, default="table", help=FORMAT_HELP)
+    parser_watch = device_action_parsers.add_parser("watch", help="Stream device join/leave/IP-change events as NDJSON.")
+    parser_watch.add_argument("--interval", type=float, default=5.0, help="Poll interval after a change, in seconds. Default: 5.")
+    parser_watch.add_argument("--max-interval", type=float, default=60.0, help="Longest poll interval while nothing changes. Default: 60.")
+    parser_history = device_action_parsers.add_parser("history", help="Show recorded device history (requires --history-db).")
+    parser_history.add_argument("identifier", nargs="?", help="Only show entries for this Hostname, IP or MAC.")
+    parser_history.add_argument("--limit", type=int, help="Show at most this many entries.")
+    parser_history.add_argument("--format", choices=output.FORMATS, default="table", help=FORMAT_HELP)
 
     # --- URL BLOCKING ---
     parser_url = feature_subparsers.add_parser("url", help="Commands for managing URL blocking rules.")
     url_action_parsers = parser_url.add_subparsers(dest="action", required=True, help="Action for the 'url' feature.")
 
-    url_action_parsers.add_parser("list", help="List all currently active URL blocking rules.")
+    parser_url_list = url_action_parsers.add_parser("list", help="List all currently active URL blocking rules.")
+    parser_url_list.add_argument("--format", choices=output.FORMATS, default="table", help=FORMAT_HELP)
 
     parser_add = url_action_parsers.add_parser("add", help="Add new URL blocking rules.")
     add_group = parser_add.add_mutually_exclusive_group(required=True)
-    add_group.add_argument("--device", help="Target device. Can be Hostname, IP, MAC, or 'all'.")
+    add_group.add_argument("--device", help="Target device. Can be Hostname, IP, MAC, '@group', or 'all'.")
     add_group.add_argument("--rules-file", help="A file containing 'device,url' rules to add.")
     parser_add.add_argument("--block", action="append", help="URL to block (comma-separated or use flag multiple times).")
+    parser_add.add_argument("--compact", action="store_true", help=COMPACT_HELP)
+    parser_add.add_argument("--plan", action="store_true", help=PLAN_HELP)
 
     parser_remove = url_action_parsers.add_parser("remove", help="Remove rules by matching device and URL.")
     remove_group = parser_remove.add_mutually_exclusive_group(required=True)
-    remove_group.add_argument("--device", help="Target device. Can be Hostname, IP, MAC, or 'all'.")
+    remove_group.add_argument("--device", help="Target device. Can be Hostname, IP, MAC, '@group', or 'all'.")
     remove_group.add_argument("--rules-file", help="A file containing 'device,url' rules to remove.")
     parser_remove.add_argument("--block", action="append", help="URL to unblock (comma-separated or use flag multiple times).")
+    parser_remove.add_argument("--compact", action="store_true", help=COMPACT_HELP)
+    parser_remove.add_argument("--plan", action="store_true", help=PLAN_HELP)
 
     parser_remove_id = url_action_parsers.add_parser("remove-id", help="Remove a specific rule by its ID number.")
     parser_remove_id.add_argument("rule_id", type=int, help="The numeric ID of the rule to remove (from url list).")
+    parser_remove_id.add_argument("--plan", action="store_true", help=PLAN_HELP)
+
+    parser_remove_all = url_action_parsers.add_parser("remove-all", help="Remove ALL URL blocking rules from the modem.")
+    parser_remove_all.add_argument("--plan", action="store_true", help=PLAN_HELP)
+
+    parser_compact = url_action_parsers.add_parser("compact", help="Merge per-device rules that cover every known device into all-devices rules.")
+    parser_compact.add_argument("--plan", action="store_true", help=PLAN_HELP)
+
+    parser_enforce = url_action_parsers.add_parser("enforce", help="Continuously re-apply a rules file, correcting any drift.")
+    parser_enforce.add_argument("--rules-file", required=True, help="A file containing the 'device,url' rules that must be present.")
+    parser_enforce.add_argument("--interval", type=float, default=60.0, help="Poll interval after drift, in seconds. Default: 60.")
+    parser_enforce.add_argument("--max-interval", type=float, default=900.0, help="Longest poll interval while nothing drifts. Default: 900.")
+    parser_enforce.add_argument("--prune", action="store_true", help="Also remove rules that are not in the rules file.")
+    parser_enforce.add_argument("--plan", action="store_true", help="Plan a single check and correction pass. " + PLAN_HELP)
+
+    parser_schedule = url_action_parsers.add_parser("schedule", help="Block URLs during daily time windows until stopped.")
+    parser_schedule.add_argument("--schedule-file", required=True, help="A file containing 'HH:MM-HH:MM,device,url' entries.")
+    parser_schedule.add_argument("--plan", action="store_true", help="Plan the initial sync for the current time. " + PLAN_HELP)
 
-    url_action_parsers.add_parser("remove-all", help="Remove ALL URL blocking rules from the modem.")
+    parser_ghosts = url_action_parsers.add_parser("ghosts", help="List rules the modem refused to delete (ghost rules).")
+    ghosts_group = parser_ghosts.add_mutually_exclusive_group()
+    ghosts_group.add_argument("--probe", action="store_true", help="Retry deleting each known ghost rule once.")
+    ghosts_group.add_argument("--clear", action="store_true", help="Forget all known ghost rules for this modem.")
+    parser_ghosts.add_argument("--plan", action="store_true", help=PLAN_HELP)
+    parser_ghosts.add_argument("--format", choices=output.FORMATS, default="table", help=FORMAT_HELP)
 
     # --- CONFIG BACKUP/RESTORE ---
     parser_config = feature_subparsers.add_parser("config", help="Backup or Restore modem configuration.")
     config_action_parsers = parser_config.add_subparsers(dest="action", required=True, help="Action for the 'config' feature.")
 
-    config_action_parsers.add_parser("list", help="List all available backups.")
-    config_action_parsers.add_parser("backup", help="Download current configuration to 'config-backups/'.")
+    parser_config_list = config_action_parsers.add_parser("list", help="List all available backups.")
+    parser_config_list.add_argument("--format", choices=output.FORMATS, default="table", help=FORMAT_HELP)
+    backup_parser = config_action_parsers.add_parser("backup", help="Download current configuration to 'config-backups/'.")
+    backup_parser.add_argument("--force", action="store_true", help="Download even if the configuration fingerprint matches the last backup.")
+    backup_parser.add_argument("--max-age", type=float, default=DEFAULT_MAX_BACKUP_AGE_DAYS, metavar="DAYS",
+                               help=f"Download anyway if the last backup is older than this. Default: {DEFAULT_MAX_BACKUP_AGE_DAYS:g}.")
+
+    diff_parser = config_action_parsers.add_parser("diff", help="Show what changed between two backups (no extraction).")
+    diff_parser.add_argument("file_a", help="Older backup file.")
+    diff_parser.add_argument("file_b", help="Newer backup file.")
+    diff_parser.add_argument("--summary", action="store_true", help="Only list the paths that changed.")
+
+    verify_parser = config_action_parsers.add_parser("verify", help="Check every backup archive for damage (in parallel).")
+    verify_parser.add_argument("--jobs", type=_positive_int, default=None, metavar="N", help="Worker processes to use. Defaults to the number of CPUs.")
+    verify_parser.add_argument("--format", choices=output.FORMATS, default="table", help=FORMAT_HELP)
 
     restore_parser = config_action_parsers.add_parser("restore", help="Restore configuration (Requires Reboot).")
     restore_parser.add_argument("file", nargs="?", help="Specific backup file to restore. Defaults to the newest file in 'config-backups/'.")
+    restore_parser.add_argument("--no-verify", action="store_true", help="Skip the integrity check before uploading.")
+
+    # --- BATCH ---
+    parser_batch = feature_subparsers.add_parser("batch", help="Run many commands over a single modem session.")
+    parser_batch.add_argument("script", nargs="?", default="-", help="File with one command per line (e.g. 'url list'). Defaults to stdin.")
+
+    return parser
+
+def run_command(args, control, device_feature, url_feature, config_feature):
+    """
+    Dispatches one parsed command to its feature.
+    Returns False if the command could not be started (bad arguments or input file).
+    """
+    if args.feature == 'device':
+        if args.action == 'list':
+            device_feature.list_devices(debug=args.debug, fmt=args.format)
+        elif args.action == 'watch':
+            device_feature.watch(interval=args.interval, max_interval=args.max_interval)
+        elif args.action == 'history':
+            device_feature.list_history(args.identifier, limit=args.limit, fmt=args.format)
+
+    elif args.feature == 'url':
+        run = None
+        if args.action == 'list':
+            url_feature.list_rules(debug=args.debug, fmt=args.format)
+        elif args.action in ('add', 'remove'):
+            rules = []
+            if args.rules_file:
+                rules = parse_rules_from_file(args.rules_file, args.groups_file)
+            else:
+                if not args.block: print("Error: --block must be specified with --device.", file=sys.stderr); return False
+                domains = [d.strip() for item in args.block for d in item.split(',')]
+                rules = expand_device_groups([(args.device, domain) for domain in domains], args.groups_file)
+            if rules is None: return False
+            if args.action == 'add':
+                run = lambda feature: feature.add(rules, compact=args.compact)
+            else:
+                run = lambda feature: feature.remove(rules, compact=args.compact)
+        elif args.action == 'remove-id':
+            run = lambda feature: feature.remove_by_id(args.rule_id)
+        elif args.action == 'remove-all':
+            run = lambda feature: feature.remove_all()
+        elif args.action == 'compact':
+            run = lambda feature: feature.compact()
+        elif args.action == 'enforce':
+            rules = parse_rules_from_file(args.rules_file, args.groups_file)
+            if rules is None: return False
+            if args.plan:
+                run = lambda feature: feature.enforce(rules, prune=args.prune, once=True)
+            else:
+                url_feature.enforce(rules, interval=args.interval, max_interval=args.max_interval, prune=args.prune)
+        elif args.action == 'schedule':
+            entries = parse_schedule_file(args.schedule_file, args.groups_file)
+            if entries is None: return False
+            if args.plan:
+                run = lambda feature: feature.schedule(entries, once=True)
+            else:
+                url_feature.schedule(entries)
+        elif args.action == 'ghosts':
+            run = lambda feature: feature.ghosts(probe=args.probe, clear=args.clear, fmt=args.format)
 
+        if run is not None:
+            if args.plan:
+                planning.print_plan(control, url_feature.ghost_store, run, history=device_feature.history)
+            else:
+                run(url_feature)
 
+    elif args.feature == 'config':
+        if args.action == 'backup':
+            config_feature.backup(force=args.force, max_age_days=args.max_age)
+        elif args.action == 'restore':
+            config_feature.restore(args.file, verify=not args.no_verify)
+        elif args.action == 'list':
+            config_feature.list_backups(fmt=args.format)
+        elif args.action == 'verify':
+            config_feature.verify(jobs=args.jobs, fmt=args.format)
+        elif args.action == 'diff':
+            config_feature.diff(args.file_a, args.file_b, summary=args.summary)
+
+    return True
+
+def parse_batch_script(parser, script, debug=False, groups_file=None):
+    """
+    Reads and parses every command of a batch script before anything runs,
+    so a typo on the last line cannot leave a half-applied batch.
+    Returns a list of (line_number, text, args), or None on error.
+    """
+    try:
+        if script == '-':
+            lines = sys.stdin.readlines()
+        else:
+            with open(script, 'r') as f:
+                lines = f.readlines()
+    except OSError as e:
+        print(f"Error: Could not read batch script '{script}': {e}", file=sys.stderr)
+        return None
+
+    commands = []
+    for i, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'): continue
+        try:
+            line_args = parser.parse_args(shlex.split(line))
+        except (SystemExit, ValueError):
+            print(f"Error: Invalid command on line #{i} of the batch script: {line}", file=sys.stderr)
+            return None
+        if line_args.feature == 'batch':
+            print(f"Error: Batch scripts cannot be nested (line #{i}).", file=sys.stderr)
+            return None
+        line_args.debug = line_args.debug or debug
+        line_args.groups_file = line_args.groups_file or groups_file
+        commands.append((i, line, line_args))
+    return commands
+
+def _status_stream(args):
+    """Where progress chatter goes. Commands that stream records keep stdout clean."""
+    if args.feature == 'device' and args.action == 'watch':
+        return sys.stderr
+    if getattr(args, 'format', 'table') != 'table':
+        return sys.stderr
+    return sys.stdout
+
+def _needs_modem(args):
+    """False for commands that only read local files (no credentials or login needed)."""
+    if args.feature == 'config' and args.action in ('verify', 'diff'):
+        return False
+    if args.feature == 'device' and args.action == 'history':
+        return False
+    return True
+
+def main():
+    """The main entry point for the CLI application."""
+    parser = build_parser()
     args = parser.parse_args()
 
-    username, password = utils.load_credentials()
-    if not (username and password):
-        print("Username and password cannot be empty.", file=sys.stderr)
-        sys.exit(1)
+    batch = None
+    if args.feature == 'batch':
+        batch = parse_batch_script(parser, args.script, debug=args.debug, groups_file=args.groups_file)
+        if batch is None:
+            sys.exit(1)
+
+    if batch is not None:
+        needs_modem = any(_needs_modem(line_args) for _, _, line_args in batch)
+    else:
+        needs_modem = _needs_modem(args)
+
+    status = _status_stream(args)
+    with contextlib.redirect_stdout(status):
+        if not needs_modem:
+            # Local-only commands must keep working while the modem is unreachable.
+            username, password = "", ""
+            transport = HTTPTransport()
+        elif args.replay:
+            # Cassettes never contain credentials, so there is nothing to load.
+            username, password = "replay", "replay"
+            try:
+                transport = ReplayTransport(args.replay, scale=args.replay_scale)
+            except (OSError, ValueError) as e:
+                print(f"Error: Could not load cassette '{args.replay}': {e}", file=sys.stderr)
+                sys.exit(1)
+        else:
+            username, password = utils.load_credentials()
+            if not (username and password):
+                print("Username and password cannot be empty.", file=sys.stderr)
+                sys.exit(1)
+            transport = HTTPTransport()
+            if args.record:
+                transport = RecordingTransport(transport, args.record)
 
-    control = ModemControl(args.modem, username, password, debug=args.debug, min_interval=args.delay)
+        control = ModemControl(args.modem, username, password, debug=args.debug, min_interval=args.delay,
+                               transport=transport, read_concurrency=args.read_concurrency)
 
-    if not control.login():
-        sys.exit(1)
+        if needs_modem and not control.login():
+            control.close()
+            sys.exit(1)
 
-    print("-" * 30)
+        print("-" * 30)
 
     # Initialize Features
-    device_feature = DeviceListingFeature(control)
+    history = None
+    if args.history_db:
+        try:
+            history = DeviceHistoryStore(args.history_db)
+        except sqlite3.Error as e:
+            print(f"Error: Could not open device history '{args.history_db}': {e}", file=sys.stderr)
+            control.close()
+            sys.exit(1)
+    device_feature = DeviceListingFeature(control, history=history)
     url_feature = URLBlockingFeature(control, device_feature)
     config_feature = ConfigFeature(control)
 
     try:
-        if args.feature == 'device':
-            if args.action == 'list':
-                device_feature.list_devices(debug=args.debug)
-
-        elif args.feature == 'url':
-            if args.action == 'list':
-                url_feature.list_rules(debug=args.debug)
-            elif args.action == 'add':
-                rules = []
-                if args.rules_file:
-                    rules = parse_rules_from_file(args.rules_file)
-                    if rules is None: sys.exit(1)
-                else:
-                    if not args.block: print("Error: --block must be specified with --device.", file=sys.stderr); sys.exit(1)
-                    domains = [d.strip() for item in args.block for d in item.split(',')]
-                    rules = [(args.device, domain) for domain in domains]
-                url_feature.add(rules)
-            elif args.action == 'remove':
-                rules = []
-                if args.rules_file:
-                    rules = parse_rules_from_file(args.rules_file)
-                    if rules is None: sys.exit(1)
-                else:
-                    if not args.block: print("Error: --block must be specified with --device.", file=sys.stderr); sys.exit(1)
-                    domains = [d.strip() for item in args.block for d in item.split(',')]
-                    rules = [(args.device, domain) for domain in domains]
-                url_feature.remove(rules)
-            elif args.action == 'remove-id':
-                url_feature.remove_by_id(args.rule_id)
-            elif args.action == 'remove-all':
-                url_feature.remove_all()
-
-        elif args.feature == 'config':
-            if args.action == 'backup':
-                config_feature.backup()
-            elif args.action == 'restore':
-                config_feature.restore(args.file)
-            elif args.action == 'list':
-                config_feature.list_backups()
+        if batch is not None:
+            # One session for the whole script; reads are shared between
+            # steps until a write invalidates them.
+            control.cache_reads = True
+            for step, (line_number, line, line_args) in enumerate(batch, 1):
+                print(f">>> [{step}/{len(batch)}] {line}")
+                if not run_command(line_args, control, device_feature, url_feature, config_feature):
+                    print(f"Batch stopped at line #{line_number}.", file=sys.stderr)
+                    sys.exit(1)
+                print()
+        elif not run_command(args, control, device_feature, url_feature, config_feature):
+            sys.exit(1)
 
     except KeyboardInterrupt:
-        print("\nOperation cancelled by user.")
+        print("\nOperation cancelled by user.", file=status)
     except Exception as e:
         print(f"\nAn unexpected error occurred: {e}", file=sys.stderr)
         if args.debug:
             traceback.print_exc()
+    finally:
+        control.close()
+        if history:
+            history.close()
+        if args.record and needs_modem:
+            print(f"Recorded modem traffic to '{args.record}'.", file=status)
 
-    print("-" * 30 + "\nScript finished.")
+    print("-" * 30 + "\nScript finished.", file=status)
     if args.wait:
         input("Press Enter to exit...")
@@ -22,7 +22,12 @@
 
 import requests
 import sys
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .transport import HTTPTransport
+
+DEFAULT_POST_WRITE_DELAY = 7.0
 
 class ModemError(Exception):
     """Base exception for modem communication errors."""
@@ -32,8 +37,10 @@ class ModemControl:
     """
     Handles low-level communication with the modem.
     Implements specific headers to mimic Chrome and handles rate limiting.
+    The wire itself is delegated to a transport (see transport.py), which
+    defaults to a live HTTPTransport.
     """
-    def __init__(self, modem_ip, username, password, debug=False, min_interval=2.0):
+    def __init__(self, modem_ip, username, password, debug=False, min_interval=2.0, transport=None, read_concurrency=1):
         self.modem_ip = modem_ip
         self.base_url = f"https://{modem_ip}/cgi"
         self.origin_url = f"https://{modem_ip}"
@@ -42,12 +49,27 @@ class ModemControl:
         self.debug = debug
         self.min_interval = min_interval
         self.last_request_time = 0.0
+        self.latency_total = 0.0
+        self.latency_count = 0
+        self._identity = None
+
+        # Independent reads may overlap (up to read_concurrency at once); writes
+        # never overlap anything. _pace_lock guards the rate limiter state.
+        self.read_concurrency = max(1, read_concurrency)
+        self._pace_lock = threading.Lock()
+        self._waiters = 0 # Callers currently sleeping in _enforce_rate_limit
+        self._write_lock = threading.Lock()
+        self._group = threading.local()
+
+        # Snapshot sharing (used by batch mode): reads are served from memory
+        # until the next write invalidates them.
+        self.cache_reads = False
+        self._read_cache = {}
 
-        self.session = requests.Session()
-        self.session.verify = False
+        self.transport = transport if transport is not None else HTTPTransport()
 
         # MIMIC CHROME HEADERS EXACTLY
-        self.session.headers.update({
+        self.transport.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36',
             'Origin': self.origin_url,
             'X-Requested-With': 'XMLHttpRequest',
@@ -55,21 +77,117 @@ class ModemControl:
             'DNT': '1'
         })
 
-        requests.packages.urllib3.disable_warnings(
-            requests.packages.urllib3.exceptions.InsecureRequestWarning
-        )
-
     def _log(self, message):
         if self.debug:
             print(f"[DEBUG] {message}", file=sys.stderr)
 
+    def sleep(self, seconds):
+        """Pauses the session. All deliberate delays go through the transport."""
+        self.transport.sleep(seconds)
+
+    def close(self):
+        """Releases the transport (and writes the cassette when recording)."""
+        self.transport.close()
+
+    def measured_latency(self):
+        """Average round-trip time of requests sent so far, or None if none were sent."""
+        if not self.latency_count:
+            return None
+        return self.latency_total / self.latency_count
+
+    def estimate_duration(self, steps, latency=0.0):
+        """
+        Estimates the wall time of an ordered list of steps under this session's pacing.
+        steps: 'GET', 'SET' (a write followed by the post-write delay) or a number
+               of seconds for an explicit pause.
+        """
+        total = 0.0
+        idle = self.min_interval # Time since the previous request finished
+        for step in steps:
+            if isinstance(step, (int, float)):
+                total += step
+                idle += step
+                continue
+            wait = max(0.0, self.min_interval - idle)
+            total += wait + latency
+            idle = 0.0
+            if step == 'SET':
+                total += DEFAULT_POST_WRITE_DELAY
+                idle = DEFAULT_POST_WRITE_DELAY
+        return total
+
     def _enforce_rate_limit(self):
-        """Ensures we do not flood the modem with requests."""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.min_interval:
-            sleep_time = self.min_interval - elapsed
+        """
+        Ensures we do not flood the modem with requests.
+        The first request of a run_reads() member holding a free pass skips the
+        wait, because the group as a whole has already waited once.
+        The wait is computed under _pace_lock but slept outside it, so other
+        threads can still record their completions; callers already waiting
+        push a newcomer one more interval back.
+        """
+        if getattr(self._group, 'free_pass', False):
+            self._group.free_pass = False
+            return
+        with self._pace_lock:
+            elapsed = self.transport.time() - self.last_request_time
+            sleep_time = self.min_interval * (1 + self._waiters) - elapsed
+            if sleep_time > 0:
+                self._waiters += 1
+        if sleep_time > 0:
             self._log(f"Rate limit: Sleeping {sleep_time:.2f}s...")
-            time.sleep(sleep_time)
+            try:
+                self.sleep(sleep_time)
+            finally:
+                with self._pace_lock:
+                    self._waiters -= 1
+
+    def _record_completion(self, started):
+        """Updates pacing and latency bookkeeping after a request returns."""
+        with self._pace_lock:
+            finished = self.transport.time()
+            self.last_request_time = max(self.last_request_time, finished)
+            self.latency_total += finished - started
+            self.latency_count += 1
+
+    def run_reads(self, *calls):
+        """
+        Runs independent read callables and returns their results in order.
+        With read_concurrency > 1 they are issued together, so the group takes
+        roughly as long as its slowest member. Writes wait until the group is done.
+        """
+        # Nested groups (a member calling get_many) run inline: the outer group
+        # already holds _write_lock, which is not reentrant.
+        if self.read_concurrency <= 1 or len(calls) < 2 or getattr(self._group, 'active', False):
+            return [call() for call in calls]
+
+        workers = min(self.read_concurrency, len(calls))
+        passes = [workers] # One pass per call that can start right away
+        passes_lock = threading.Lock()
+
+        def member(call):
+            with passes_lock:
+                granted = passes[0] > 0
+                if granted:
+                    passes[0] -= 1
+            self._group.active = True
+            self._group.free_pass = granted
+            try:
+                return call()
+            finally:
+                self._group.active = False
+                self._group.free_pass = False
+
+        with self._write_lock:
+            self._enforce_rate_limit()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(member, call) for call in calls]
+                return [future.result() for future in futures]
+
+    def get_many(self, object_paths):
+        """Fetches several independent objects (see run_reads). Returns {object_path: data}."""
+        object_paths = list(dict.fromkeys(object_paths))
+        results = self.run_reads(*[lambda path=path: self.get_request(path) for path in object_paths])
+        return dict(zip(object_paths, results))
 
     def _send_request(self, method, url, **kwargs):
         """
@@ -82,12 +200,9 @@ class ModemControl:
             self._enforce_rate_limit()
 
             try:
-                if method == 'GET':
-                    response = self.session.get(url, **kwargs)
-                else:
-                    response = self.session.post(url, **kwargs)
-
-                self.last_request_time = time.time()
+                started = self.transport.time()
+                response = self.transport.request(method, url, **kwargs)
+                self._record_completion(started)
 
                 # If the modem sends a 500, we want to know.
                 response.raise_for_status()
@@ -102,7 +217,7 @@ class ModemControl:
                 # Only GET requests retry
                 backoff = 2.0 * attempt
                 self._log(f"Backing off for {backoff}s before retry...")
-                time.sleep(backoff)
+                self.sleep(backoff)
 
         raise ModemError("Unexpected unreachable code in _send_request")
 
@@ -113,13 +228,14 @@ class ModemControl:
         try:
             self.last_request_time = 0
             self._enforce_rate_limit()
-            response = self.session.post(
+            response = self.transport.request(
+                'POST',
                 f"{self.base_url}/cgi_action",
                 data={"username": self.username, "password": self.password},
                 headers=headers
             )
-            self.last_request_time = time.time()
-            if 'Session-Id' in self.session.cookies:
+            self.last_request_time = self.transport.time()
+            if 'Session-Id' in self.transport.cookies:
                 print("Login successful.")
                 return True
             print("Login failed. Check credentials.", file=sys.stderr)
@@ -128,8 +244,16 @@ class ModemControl:
             print(f"Error connecting to modem: {e}", file=sys.stderr)
             return False
 
-    def get_request(self, object_path):
-        """Sends a GET request."""
+    def get_request(self, object_path, use_cache=True):
+        """
+        Sends a GET request.
+        With cache_reads enabled, a snapshot taken since the last write is reused
+        unless use_cache is False.
+        """
+        if self.cache_reads and use_cache and object_path in self._read_cache:
+            self._log(f"Using cached snapshot of Object: {object_path}")
+            return self._read_cache[object_path]
+
         self._log(f"Sending GET for Object: {object_path}")
         headers = {'Referer': f"{self.origin_url}/index.html"}
         response = self._send_request('GET', f"{self.base_url}/cgi_get",
@@ -139,19 +263,64 @@ class ModemControl:
             data = response.json()
             if data is None:
                 raise ValueError("Modem returned 'null' JSON.")
-            return data
         except (ValueError, TypeError) as e:
             self._log(f"Failed to parse JSON from {object_path}: {e}")
             raise ModemError(f"Invalid response data from modem for {object_path}")
 
-    def set_request(self, payload, post_write_delay=7.0):
+        if self.cache_reads:
+            self._read_cache[object_path] = data
+        return data
+
+    def get_raw(self, object_path):
+        """
+        Sends a GET request and returns the undecoded response body.
+        Never cached; used by pollers that fingerprint a payload before parsing it.
+        """
+        self._log(f"Sending raw GET for Object: {object_path}")
+        headers = {'Referer': f"{self.origin_url}/index.html"}
+        response = self._send_request('GET', f"{self.base_url}/cgi_get",
+                                      params={'Object': object_path},
+                                      headers=headers)
+        return response.content
+
+    def invalidate_cache(self):
+        """Drops all cached snapshots. Called before every write."""
+        if self._read_cache:
+            self._log("Write pending: Discarding cached snapshots.")
+        self._read_cache.clear()
+
+    def get_identity(self, data=None):
+        """
+        Fetches Model Name and Serial Number (cached for the session).
+        data: an already fetched Device.DeviceInfo response, to avoid a second GET.
+        Returns: (model_name, serial_number)
+        Raises: ModemError on failure.
+        """
+        if self._identity is None:
+            if data is None:
+                data = self.get_request('Device.DeviceInfo')
+            model = "C4000"
+            serial = "Unknown"
+
+            for item in data.get('Objects', []):
+                for param in item.get('Param', []):
+                    if param['ParamName'] == 'ModelName':
+                        model = param['ParamValue']
+                    elif param['ParamName'] == 'SerialNumber':
+                        serial = param['ParamValue']
+            self._identity = (model, serial)
+        return self._identity
+
+    def set_request(self, payload, post_write_delay=DEFAULT_POST_WRITE_DELAY):
         """Sends a SET request with the correct configuration Referer."""
         self._log(f"Sending SET with Payload: {payload}")
-        headers = {'Referer': f"{self.origin_url}/configuring_applysettings.html"}
-        self._send_request('POST', f"{self.base_url}/cgi_set", data=payload, headers=headers)
-        if post_write_delay > 0:
-            self._log(f"Write safety: Pausing {post_write_delay}s for firmware commit...")
-            time.sleep(post_write_delay)
+        with self._write_lock:
+            self.invalidate_cache()
+            headers = {'Referer': f"{self.origin_url}/configuring_applysettings.html"}
+            self._send_request('POST', f"{self.base_url}/cgi_set", data=payload, headers=headers)
+            if post_write_delay > 0:
+                self._log(f"Write safety: Pausing {post_write_delay}s for firmware commit...")
+                self.sleep(post_write_delay)
         return True
 
     def send_download(self, payload, referer_path):
@@ -172,22 +341,25 @@ class ModemControl:
 
         headers = {'Referer': f"{self.origin_url}/{referer_path}"}
 
-        self._enforce_rate_limit()
-        try:
-            # We invoke session.post directly to handle 'files' and 'params'
-            # without passing through the generic JSON/data wrappers.
-            response = self.session.post(
-                url,
-                files=files,
-                params=params,
-                headers=headers
-            )
-            self.last_request_time = time.time()
-            response.raise_for_status()
+        with self._write_lock:
+            self.invalidate_cache()
+            self._enforce_rate_limit()
+            try:
+                # We invoke the transport directly to handle 'files' and 'params'
+                # without passing through the generic JSON/data wrappers.
+                response = self.transport.request(
+                    'POST',
+                    url,
+                    files=files,
+                    params=params,
+                    headers=headers
+                )
+                self.last_request_time = self.transport.time()
+                response.raise_for_status()
 
-            if post_write_delay > 0:
-                 self._log(f"Upload complete. Waiting {post_write_delay}s for processing...")
-                 time.sleep(post_write_delay)
-            return True
-        except requests.exceptions.RequestException as e:
-             raise ModemError(f"Upload failed: {e}")
+                if post_write_delay > 0:
+                     self._log(f"Upload complete. Waiting {post_write_delay}s for processing...")
+                     self.sleep(post_write_delay)
+                return True
+            except requests.exceptions.RequestException as e:
+                 raise ModemError(f"Upload failed: {e}")
@@ -0,0 +1,67 @@
+# MIT License
+#
+# Copyright (c) [Year] [Your Name or Handle]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import datetime
+from .json_store import JSONStore
+
+class BackupIndex(JSONStore):
+    """
+    Bookkeeping for the backup directory, kept in a hidden JSON file next to
+    the archives. Records, per modem serial, the configuration fingerprint of
+    the newest backup so unchanged configurations are not downloaded again,
+    the SHA-256 of every archive as it was downloaded, and the outcome of
+    past integrity checks keyed by (path, size, mtime).
+    """
+    def last_backup(self, serial):
+        """Returns {'fingerprint', 'file', 'saved'} for the newest recorded backup of a modem, or None."""
+        return self._load().get('fingerprints', {}).get(serial)
+
+    def record_backup(self, serial, fingerprint, filename):
+        """Remembers the fingerprint of a backup that was just written."""
+        self._load().setdefault('fingerprints', {})[serial] = {
+            'fingerprint': fingerprint,
+            'file': filename,
+            'saved': datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+        self._save()
+
+    def record_digest(self, filename, digest):
+        """Remembers the SHA-256 of an archive as it came off the wire."""
+        self._load().setdefault('digests', {})[filename] = digest
+        self._save()
+
+    def digest(self, filename):
+        return self._load().get('digests', {}).get(filename)
+
+    def cached_verification(self, path, size, mtime_ns):
+        """Returns the stored check result for a file, unless it changed since."""
+        entry = self._load().get('verified', {}).get(path)
+        if entry and entry['size'] == size and entry['mtime_ns'] == mtime_ns:
+            return entry
+        return None
+
+    def record_verifications(self, results):
+        """Stores check results (dicts with path, size, mtime_ns, ok, detail) in one write."""
+        verified = self._load().setdefault('verified', {})
+        for result in results:
+            verified[result['path']] = {key: result[key] for key in ('size', 'mtime_ns', 'ok', 'detail')}
+        self._save()
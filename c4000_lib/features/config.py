@@ -25,90 +25,413 @@ import sys
 import glob
 import datetime
 import time
+import difflib
+import hashlib
+import tarfile
+import json
+import gzip
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from ..core import ModemError
+from .. import output
+from .backup_index import BackupIndex
+from .url_blocking import URL_FILTER_OBJECT
 
 BACKUP_DIR = "config-backups"
+BACKUP_INDEX_FILE = os.path.join(BACKUP_DIR, ".index.json")
+# The fingerprint only covers some objects, so an unchanged one is trusted for this long at most.
+DEFAULT_MAX_BACKUP_AGE_DAYS = 7.0
+
+# Objects read for the pre-backup fingerprint: the device info (minus the
+# parameters below) and the URL filter table this tool edits.
+DEVICE_INFO_OBJECT = 'Device.DeviceInfo'
+FINGERPRINT_OBJECTS = [DEVICE_INFO_OBJECT, URL_FILTER_OBJECT]
+# Parameter/object name fragments that change without any configuration change.
+VOLATILE_FRAGMENTS = ('UpTime', 'Time', 'MemoryStatus', 'ProcessStatus', 'TemperatureStatus')
+
+def _readable_size(size_bytes):
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f} KB"
+    return f"{size_bytes / (1024*1024):.1f} MB"
+
+BACKUP_FIELDS = ['created', 'size_bytes', 'filename', 'path']
+BACKUP_COLUMNS = [
+    output.Column('Created (Local Time)', 'created', 22),
+    output.Column('Size', lambda r: _readable_size(r['size_bytes']), 10),
+    output.Column('Filename', 'filename', rule=30),
+]
+
+def _config_fingerprint(state):
+    """
+    Hashes the configuration-relevant parts of a {object_path: data} snapshot.
+    Volatile parameters (uptime, clocks, load) are left out so an idle modem
+    keeps the same fingerprint.
+    """
+    stable = []
+    for object_path in FINGERPRINT_OBJECTS:
+        for item in state.get(object_path, {}).get('Objects', []):
+            obj_name = item.get('ObjName', '')
+            if any(fragment in obj_name for fragment in VOLATILE_FRAGMENTS):
+                continue
+            for param in item.get('Param', []):
+                name = param.get('ParamName', '')
+                if not any(fragment in name for fragment in VOLATILE_FRAGMENTS):
+                    stable.append((obj_name, name, param.get('ParamValue')))
+    return hashlib.sha256(json.dumps(sorted(stable)).encode('utf-8')).hexdigest()
+
+# Changed members larger than this are reported, not line-diffed, so memory is bounded per member.
+DIFF_MAX_MEMBER_BYTES = 4 * 1024 * 1024
+
+SPECIAL_MEMBER_TYPES = {tarfile.CHRTYPE: 'character device', tarfile.BLKTYPE: 'block device', tarfile.FIFOTYPE: 'FIFO'}
+
+def _member_signature(archive, member):
+    """
+    Size and SHA-256 of a regular member (read in chunks), its link target,
+    or ('special', type) for devices and FIFOs, which have no content to read.
+    """
+    if member.issym() or member.islnk():
+        return ('link', member.linkname)
+    if not member.isfile():
+        return ('special', SPECIAL_MEMBER_TYPES.get(member.type, 'special file'))
+    digest = hashlib.sha256()
+    stream = archive.extractfile(member)
+    for chunk in iter(lambda: stream.read(65536), b''):
+        digest.update(chunk)
+    return (member.size, digest.hexdigest())
+
+def _scan_archive(path):
+    """
+    Streams a backup archive once without extracting it.
+    Returns {member_name: signature}; directories are skipped.
+    """
+    signatures = {}
+    with tarfile.open(path, 'r|gz') as archive:
+        for member in archive:
+            if member.isdir():
+                continue
+            signatures[member.name] = _member_signature(archive, member)
+    return signatures
+
+def _iter_members(path, names):
+    """Streams an archive again, yielding (name, bytes) for the requested regular members only."""
+    with tarfile.open(path, 'r|gz') as archive:
+        for member in archive:
+            if member.name in names and member.isfile():
+                yield member.name, archive.extractfile(member).read()
+
+def _decode_lines(data):
+    """Returns the text lines of a member, or None if it looks binary."""
+    if b'\0' in data:
+        return None
+    return data.decode('utf-8', errors='replace').splitlines()
+
+VERIFY_FIELDS = ['ok', 'filename', 'detail', 'cached', 'path']
+VERIFY_COLUMNS = [
+    output.Column('Status', lambda r: 'OK' if r['ok'] else 'FAILED', 8),
+    output.Column('Filename', 'filename', 50),
+    output.Column('Detail', lambda r: r['detail'] + (' (cached)' if r['cached'] else ''), rule=30),
+]
+
+class _HashingReader:
+    """Read-only file wrapper that hashes every byte passing through it."""
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.sha256.update(data)
+        return data
+
+def _drain(stream):
+    while stream.read(65536):
+        pass
+
+def _verify_archive(path, expected_digest=None):
+    """
+    Checks one archive in a single streaming pass: the tar structure, every
+    member's data, the gzip CRC/length trailer and, when known, the digest
+    recorded at download time. Runs in a worker process.
+    Returns: (ok, detail)
+    """
+    members = 0
+    try:
+        with open(path, 'rb') as raw:
+            reader = _HashingReader(raw)
+            with gzip.GzipFile(fileobj=reader, mode='rb') as gz:
+                with tarfile.open(fileobj=gz, mode='r|') as archive:
+                    for member in archive:
+                        if member.isfile():
+                            _drain(archive.extractfile(member))
+                        members += 1
+                # Reading to the end makes gzip check its trailer.
+                _drain(gz)
+            _drain(reader)
+    except (tarfile.TarError, OSError, EOFError, zlib.error) as e:
+        return False, f"Damaged archive: {e}"
+
+    if not members:
+        return False, "Archive is empty"
+    if expected_digest is None:
+        return True, f"{members} members (no digest recorded)"
+    if reader.sha256.hexdigest() != expected_digest:
+        return False, "Does not match the digest recorded at download time"
+    return True, f"{members} members, digest matches"
 
 class ConfigFeature:
     """Handles configuration Backup, Restore, and Listing operations."""
     def __init__(self, control):
         self.control = control
+        self.index = BackupIndex(BACKUP_INDEX_FILE)
 
-    def _get_modem_identity(self):
+    def _get_modem_identity(self, state=None):
         """
         Fetches Model Name and Serial Number to construct standard filenames.
+        state: a snapshot from _config_state(), reused to avoid a second GET.
         Returns: (model_name, serial_number)
         """
-        try:
-            # Query DeviceInfo for identity
-            data = self.control.get_request('Device.DeviceInfo')
-            model = "C4000"
-            serial = "Unknown"
-
-            for item in data.get('Objects', []):
-                for param in item.get('Param', []):
-                    if param['ParamName'] == 'ModelName':
-                        model = param['ParamValue']
-                    elif param['ParamName'] == 'SerialNumber':
-                        serial = param['ParamValue']
-            return model, serial
-        except Exception:
+        if state is None:
             self.control._log("Could not fetch identity. Using defaults.")
             return "C4000", "Generic"
+        return self.control.get_identity(state[DEVICE_INFO_OBJECT])
 
-    def list_backups(self):
+    def _config_state_reads(self):
+        """
+        One read callable per fingerprint object, to be passed to a single
+        run_reads() group (possibly next to the download). Each returns None
+        instead of raising.
+        """
+        def read(object_path):
+            try:
+                return self.control.get_request(object_path)
+            except ModemError as e:
+                self.control._log(f"Could not read {object_path} for the configuration fingerprint: {e}")
+                return None
+        return [lambda path=path: read(path) for path in FINGERPRINT_OBJECTS]
+
+    @staticmethod
+    def _config_state(results):
+        """Builds {object_path: data} from _config_state_reads() results, or None if any read failed."""
+        if any(data is None for data in results):
+            return None
+        return dict(zip(FINGERPRINT_OBJECTS, results))
+
+    def list_backups(self, fmt='table'):
         """Lists available backup files, sorted by date (newest last)."""
-        if not os.path.exists(BACKUP_DIR):
+        files = []
+        if os.path.exists(BACKUP_DIR):
+            search_path = os.path.join(BACKUP_DIR, "*.tar.gz")
+            files = glob.glob(search_path)
+        elif fmt == 'table':
             print(f"No backup directory found at './{BACKUP_DIR}'.")
             return
 
-        search_path = os.path.join(BACKUP_DIR, "*.tar.gz")
-        files = glob.glob(search_path)
+        # Sort by modification time (Oldest -> Newest)
+        files.sort(key=os.path.getmtime)
 
-        if not files:
-            print(f"No configuration backups found in '{BACKUP_DIR}/'.")
+        def records():
+            for filepath in files:
+                stat = os.stat(filepath)
+                yield {
+                    'created': datetime.datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+                    'size_bytes': stat.st_size,
+                    'filename': os.path.basename(filepath),
+                    'path': filepath,
+                }
+
+        output.write_records(records(), fmt, BACKUP_FIELDS, BACKUP_COLUMNS,
+                             empty_message=f"No configuration backups found in '{BACKUP_DIR}/'.")
+
+    def _stored_digest(self, path):
+        """Digests are recorded by filename for archives downloaded into BACKUP_DIR."""
+        if os.path.dirname(os.path.abspath(path)) != os.path.abspath(BACKUP_DIR):
+            return None
+        return self.index.digest(os.path.basename(path))
+
+    def _check_archives(self, paths, jobs=None):
+        """
+        Verifies archives, reusing stored results for files whose size and
+        mtime have not changed. Stale files are checked in a process pool.
+        Returns one result dict per path, in order.
+        """
+        results, stale = [], []
+        for path in paths:
+            stat = os.stat(path)
+            result = {
+                'path': os.path.normpath(path),
+                'filename': os.path.basename(path),
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+            }
+            cached = self.index.cached_verification(result['path'], result['size'], result['mtime_ns'])
+            if cached:
+                result.update(ok=cached['ok'], detail=cached['detail'], cached=True)
+            else:
+                stale.append(result)
+            results.append(result)
+
+        if stale:
+            paths = [result['path'] for result in stale]
+            digests = [self._stored_digest(path) for path in paths]
+            if len(stale) == 1 or jobs == 1:
+                outcomes = list(map(_verify_archive, paths, digests))
+            else:
+                with ProcessPoolExecutor(max_workers=jobs) as pool:
+                    outcomes = list(pool.map(_verify_archive, paths, digests))
+            for result, (ok, detail) in zip(stale, outcomes):
+                result.update(ok=ok, detail=detail, cached=False)
+            self.index.record_verifications(stale)
+        return results
+
+    def verify(self, jobs=None, fmt='table'):
+        """Checks the integrity of every backup archive. Only new or changed files are read."""
+        files = []
+        if os.path.exists(BACKUP_DIR):
+            files = sorted(glob.glob(os.path.join(BACKUP_DIR, "*.tar.gz")), key=os.path.getmtime)
+        elif fmt == 'table':
+            print(f"No backup directory found at './{BACKUP_DIR}'.")
             return
 
-        # Sort by modification time (Oldest -> Newest)
-        files.sort(key=os.path.getmtime)
+        results = self._check_archives(files, jobs=jobs)
+        checked = sum(1 for result in results if not result['cached'])
+        if results:
+            # Keep machine-readable output parseable.
+            print(f"Verified {checked} archive(s); {len(results) - checked} unchanged since the last check.",
+                  file=sys.stdout if fmt == 'table' else sys.stderr)
+        output.write_records(results, fmt, VERIFY_FIELDS, VERIFY_COLUMNS,
+                             empty_message=f"No configuration backups found in '{BACKUP_DIR}/'.")
 
-        print(f"{'Created (Local Time)':<22} {'Size':<10} {'Filename'}")
-        print(f"{'-'*22} {'-'*10} {'-'*30}")
+        failed = sum(1 for result in results if not result['ok'])
+        if failed:
+            print(f"Warning: {failed} archive(s) failed verification.", file=sys.stderr)
 
-        for filepath in files:
-            stat = os.stat(filepath)
-            ts = datetime.datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+    def diff(self, file_a, file_b, summary=False):
+        """
+        Compares two backup archives member by member without extracting them.
+        Members are matched by size and hash first; only the ones that changed
+        are read again and line-diffed. The changed members of A are held in
+        memory while B streams past, so memory grows with their total size;
+        members over DIFF_MAX_MEMBER_BYTES are only reported, never read.
+        """
+        for path in (file_a, file_b):
+            if not os.path.exists(path):
+                print(f"Error: File '{path}' not found.", file=sys.stderr)
+                return
 
-            # Convert size to readable format
-            size_bytes = stat.st_size
-            if size_bytes < 1024:
-                size_str = f"{size_bytes} B"
-            elif size_bytes < 1024 * 1024:
-                size_str = f"{size_bytes / 1024:.1f} KB"
-            else:
-                size_str = f"{size_bytes / (1024*1024):.1f} MB"
+        try:
+            old, new = _scan_archive(file_a), _scan_archive(file_b)
+        except (tarfile.TarError, OSError, EOFError) as e:
+            print(f"Error: Could not read backup archive: {e}", file=sys.stderr)
+            return
 
-            filename = os.path.basename(filepath)
-            print(f"{ts:<22} {size_str:<10} {filename}")
+        removed = sorted(old.keys() - new.keys())
+        added = sorted(new.keys() - old.keys())
+        changed = sorted(name for name in old.keys() & new.keys() if old[name] != new[name])
+
+        if not (removed or added or changed):
+            print("No differences.")
+            return
+
+        if summary:
+            for status, names in (('D', removed), ('A', added), ('M', changed)):
+                for name in names:
+                    print(f"{status}  {name}")
+        else:
+            for name in removed:
+                print(f"Only in {file_a}: {name}")
+            for name in added:
+                print(f"Only in {file_b}: {name}")
+
+            # Links and special files have no content to diff; describe them instead.
+            links = [name for name in changed if not (isinstance(old[name][0], int) and isinstance(new[name][0], int))]
+            for name in links:
+                label = "Link changed" if 'link' in (old[name][0], new[name][0]) else "Type changed"
+                print(f"{label}: {name} ({self._describe(old[name])} -> {self._describe(new[name])})")
+
+            oversized = [name for name in changed if name not in links and
+                         max(old[name][0], new[name][0]) > DIFF_MAX_MEMBER_BYTES]
+            for name in oversized:
+                print(f"Files a/{name} and b/{name} differ (too large to diff: "
+                      f"{_readable_size(old[name][0])} -> {_readable_size(new[name][0])})")
+
+            # Keep only the changed members of A, then diff each B member as it streams past.
+            wanted = set(changed) - set(links) - set(oversized)
+            try:
+                before = dict(_iter_members(file_a, wanted))
+                for name, data in _iter_members(file_b, wanted):
+                    self._print_member_diff(name, before.pop(name, b''), data)
+            except (tarfile.TarError, OSError, EOFError) as e:
+                print(f"Error: Could not read backup archive: {e}", file=sys.stderr)
+                return
+
+        total = len(removed) + len(added) + len(changed)
+        print(f"\n{total} member(s) differ ({len(changed)} modified, {len(added)} added, {len(removed)} removed).")
+
+    @staticmethod
+    def _describe(signature):
+        kind, value = signature
+        if kind == 'link':
+            return f"link to {value}"
+        if kind == 'special':
+            return value
+        return f"file, {_readable_size(kind)}"
+
+    def _print_member_diff(self, name, before, after):
+        """Prints a unified diff of one archive member, or a note for binary content."""
+        old_lines, new_lines = _decode_lines(before), _decode_lines(after)
+        if old_lines is None or new_lines is None:
+            print(f"Binary files a/{name} and b/{name} differ")
+            return
+        for line in difflib.unified_diff(old_lines, new_lines, fromfile=f"a/{name}", tofile=f"b/{name}", lineterm=''):
+            print(line)
 
-    def backup(self):
-        """Downloads the current configuration to a local file."""
+    def backup(self, force=False, max_age_days=DEFAULT_MAX_BACKUP_AGE_DAYS):
+        """
+        Downloads the current configuration to a local file.
+        A cheap fingerprint read comes first; if it matches the newest recorded
+        backup for this modem, that file still exists and it is younger than
+        max_age_days, the download is skipped. The age bound catches settings
+        the fingerprint does not cover. force=True always downloads.
+        """
         if not os.path.exists(BACKUP_DIR):
             os.makedirs(BACKUP_DIR)
             print(f"Created backup directory: {BACKUP_DIR}/")
 
-        print("Requesting configuration backup from modem...")
-
         # Prepare the request
         payload = {'Action': 'BackUp'}
         referer = 'utilities_configurationsave.html'
+        download = lambda: self.control.send_download(payload, referer)
 
         try:
-            response = self.control.send_download(payload, referer)
+            if force:
+                # Nothing to decide, so the fingerprint read may run alongside the download.
+                print("Requesting configuration backup from modem...")
+                response, *results = self.control.run_reads(download, *self._config_state_reads())
+            else:
+                print("Checking whether the configuration changed...")
+                results = self.control.run_reads(*self._config_state_reads())
+
+            state = self._config_state(results)
+
+            model, serial = self._get_modem_identity(state)
+            fingerprint = _config_fingerprint(state) if state is not None else None
+
+            if not force:
+                last = self.index.last_backup(serial) if fingerprint else None
+                if last and last['fingerprint'] == fingerprint and \
+                   os.path.exists(os.path.join(BACKUP_DIR, last['file'])):
+                    age = datetime.datetime.now() - datetime.datetime.fromisoformat(last['saved'])
+                    if age < datetime.timedelta(days=max_age_days):
+                        print(f"Configuration unchanged since '{last['file']}'. Skipping download (use --force to download anyway).")
+                        return
+                    print(f"Fingerprint unchanged, but the last backup is {age.days} day(s) old. Downloading anyway.")
+                print("Requesting configuration backup from modem...")
+                response = download()
 
             # Generate Filename
             # Default format: DB-<Model><Serial>_<Timestamp>.tar.gz
-            model, serial = self._get_modem_identity()
             timestamp = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
             filename = f"DB-{model}{serial}_{timestamp}.tar.gz"
 
@@ -123,17 +446,29 @@ class ConfigFeature:
             filepath = os.path.join(BACKUP_DIR, filename)
 
             print(f"Downloading to '{filepath}'...")
-            with open(filepath, 'wb') as f:
+            # An interrupted download stays a '.part' file and is never mistaken for a backup.
+            digest = hashlib.sha256()
+            part_path = f"{filepath}.part"
+            with open(part_path, 'wb') as f:
                 for chunk in response.iter_content(chunk_size=8192):
+                    digest.update(chunk)
                     f.write(chunk)
+            os.replace(part_path, filepath)
 
+            self.index.record_digest(filename, digest.hexdigest())
+            if fingerprint:
+                self.index.record_backup(serial, fingerprint, filename)
             print(f"Success: Backup saved to {filepath}")
 
         except ModemError as e:
             print(f"Backup failed: {e}", file=sys.stderr)
 
-    def restore(self, filename=None):
-        """Restores a configuration file, defaulting to the newest."""
+    def restore(self, filename=None, verify=True):
+        """
+        Restores a configuration file, defaulting to the newest.
+        Unless verify is False, the file must pass the same check as
+        'config verify' (reusing a stored result when the file is unchanged).
+        """
 
         # 1. Resolve Filename
         target_file = filename
@@ -152,9 +487,20 @@ class ConfigFeature:
             print(f"Error: File '{target_file}' not found.", file=sys.stderr)
             return
 
+        if verify:
+            result = self._check_archives([target_file])[0]
+            if not result['ok']:
+                print(f"Error: Refusing to restore '{target_file}': {result['detail']}. Use --no-verify to override.", file=sys.stderr)
+                return
+            print(f"Integrity check passed: {result['detail']}.")
+
         # 2. Confirmation
         print("\nWARNING: Restoring a configuration will overwrite current settings and REBOOT the modem.")
-        confirm = input(f"Are you sure you want to restore '{target_file}'? (y/N): ")
+        try:
+            confirm = input(f"Are you sure you want to restore '{target_file}'? (y/N): ")
+        except EOFError:
+            # No interactive input (e.g. a batch script read from stdin)
+            confirm = ''
         if confirm.lower() != 'y':
             print("Restore cancelled.")
             return
@@ -0,0 +1,117 @@
+# MIT License
+#
+# Copyright (c) [Year] [Your Name or Handle]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import copy
+import json
+import sqlite3
+import datetime
+
+CORE_PARAMS = ('PhysAddress', 'IPAddress', 'HostName')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS host_history (
+    mac        TEXT NOT NULL COLLATE NOCASE,
+    ip         TEXT NOT NULL,
+    hostname   TEXT NOT NULL COLLATE NOCASE,
+    first_seen TEXT NOT NULL,
+    last_seen  TEXT NOT NULL,
+    params     TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (mac, ip, hostname)
+);
+CREATE INDEX IF NOT EXISTS idx_host_history_mac ON host_history (mac, last_seen);
+CREATE INDEX IF NOT EXISTS idx_host_history_ip ON host_history (ip, last_seen);
+CREATE INDEX IF NOT EXISTS idx_host_history_hostname ON host_history (hostname, last_seen);
+"""
+
+class DeviceHistoryStore:
+    """
+    Optional SQLite record of every host-table snapshot.
+    One row per (MAC, IP, hostname) combination with first/last seen
+    timestamps and the remaining host parameters, so questions like
+    "when did this MAC last have this IP" need no modem traffic.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self.writable = True
+
+    def read_only(self):
+        """Returns a view on the same database whose record_snapshot() writes nothing (used by --plan)."""
+        view = copy.copy(self)
+        view.writable = False
+        return view
+
+    def record_snapshot(self, raw_data):
+        """Upserts every host in a raw Device.Hosts.Host response in one transaction."""
+        if not self.writable:
+            return 0
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        rows = []
+        for item in raw_data.get('Objects', []):
+            params = {p.get('ParamName'): p.get('ParamValue', '') for p in item.get('Param', []) if p.get('ParamName')}
+            # Keep the modem's spelling: rule MACs are compared verbatim (the column ignores case).
+            mac = params.get('PhysAddress', '')
+            if not mac:
+                continue
+            extra = json.dumps({k: v for k, v in params.items() if k not in CORE_PARAMS}, sort_keys=True)
+            rows.append((mac, params.get('IPAddress', ''), params.get('HostName', ''), extra))
+
+        # UPDATE then INSERT OR IGNORE works on every SQLite version (no UPSERT syntax needed).
+        with self.conn:
+            # Setting mac as well repairs rows stored in a different case by older versions.
+            self.conn.executemany(
+                "UPDATE host_history SET mac = ?, last_seen = ?, params = ? WHERE mac = ? AND ip = ? AND hostname = ?",
+                [(mac, now, extra, mac, ip, name) for mac, ip, name, extra in rows])
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO host_history (mac, ip, hostname, first_seen, last_seen, params) VALUES (?, ?, ?, ?, ?, ?)",
+                [(mac, ip, name, now, now, extra) for mac, ip, name, extra in rows])
+        return len(rows)
+
+    def query(self, identifier=None, limit=None):
+        """
+        Returns history rows (newest first), optionally only those whose MAC,
+        IP or hostname matches the identifier (case-insensitive).
+        """
+        sql = "SELECT * FROM host_history"
+        args = []
+        if identifier:
+            # A UNION lets SQLite use each column's index instead of scanning for the OR.
+            sql = ("SELECT * FROM host_history WHERE mac = ? UNION "
+                   "SELECT * FROM host_history WHERE ip = ? UNION "
+                   "SELECT * FROM host_history WHERE hostname = ?")
+            args = [identifier, identifier, identifier]
+        sql += " ORDER BY last_seen DESC"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, args)]
+
+    def lookup(self, identifier):
+        """Returns the most recently seen row matching the identifier, or None."""
+        rows = self.query(identifier, limit=1)
+        return rows[0] if rows else None
+
+    def close(self):
+        self.conn.close()
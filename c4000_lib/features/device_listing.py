@@ -21,23 +21,44 @@
 # SOFTWARE.
 
 import json
+import contextlib
 import sys
+import hashlib
+import datetime
 from ..core import ModemError
+from .. import output
+
+HOSTS_OBJECT = 'Device.Hosts.Host'
+WATCH_BACKOFF = 1.5 # Poll interval multiplier while the host table is unchanged
+
+def _or_na(key):
+    return lambda record: 'N/A' if record.get(key) is None else record[key]
+
+DEVICE_FIELDS = ['hostname', 'ip', 'mac']
+DEVICE_COLUMNS = [
+    output.Column('Hostname', _or_na('hostname'), 30),
+    output.Column('IP Address', _or_na('ip'), 18),
+    output.Column('MAC Address', _or_na('mac'), 20),
+]
+
+HISTORY_FIELDS = ['hostname', 'ip', 'mac', 'first_seen', 'last_seen', 'params']
+HISTORY_COLUMNS = [
+    output.Column('Hostname', lambda r: r['hostname'] or 'N/A', 30),
+    output.Column('IP Address', lambda r: r['ip'] or 'N/A', 18),
+    output.Column('MAC Address', 'mac', 20),
+    output.Column('First Seen', 'first_seen', 20),
+    output.Column('Last Seen', 'last_seen', 20),
+]
 
 class DeviceListingFeature:
     """Handles the logic for listing devices on the network."""
-    def __init__(self, control):
+    def __init__(self, control, history=None):
         self.control = control
+        self.history = history # Optional DeviceHistoryStore
 
-    def get_all(self):
-        """
-        Fetches and parses all known devices.
-        Returns: (list of devices, raw_data)
-        Raises: ModemError on failure.
-        """
-        self.control._log("Querying modem for known devices...")
-        raw_data = self.control.get_request('Device.Hosts.Host')
-
+    @staticmethod
+    def parse_hosts(raw_data):
+        """Parses a raw host table response into a list of devices."""
         devices = []
         for item in raw_data.get('Objects', []):
             device_info = {}
@@ -46,12 +67,28 @@ class DeviceListingFeature:
                     device_info[param['ParamName']] = param.get('ParamValue', '')
             if device_info.get('PhysAddress'):
                 devices.append(device_info)
+        return devices
+
+    def get_all(self, raw_data=None):
+        """
+        Fetches and parses all known devices.
+        raw_data: an already fetched response to parse instead of querying the modem.
+        Returns: (list of devices, raw_data)
+        Raises: ModemError on failure.
+        """
+        if raw_data is None:
+            self.control._log("Querying modem for known devices...")
+            raw_data = self.control.get_request(HOSTS_OBJECT)
+
+        devices = self.parse_hosts(raw_data)
+        if self.history:
+            self.history.record_snapshot(raw_data)
 
         self.control._log(f"Found {len(devices)} actual devices.")
         return devices, raw_data
 
-    def list_devices(self, debug=False):
-        """Prints a formatted list of devices."""
+    def list_devices(self, debug=False, fmt='table'):
+        """Prints the list of devices as a table or streams it as JSON/NDJSON/CSV."""
         try:
             devices, raw_data = self.get_all()
             if debug:
@@ -59,12 +96,99 @@ class DeviceListingFeature:
                 print(json.dumps(raw_data, indent=2), file=sys.stderr)
                 print("--- End Raw Response ---\n", file=sys.stderr)
 
-            if devices:
-                print(f"{'Hostname':<30} {'IP Address':<18} {'MAC Address':<20}")
-                print(f"{'-'*30} {'-'*18} {'-'*20}")
-                for dev in devices:
-                    print(f"{dev.get('HostName', 'N/A'):<30} {dev.get('IPAddress', 'N/A'):<18} {dev.get('PhysAddress', 'N/A'):<20}")
-            else:
-                print("No devices found on the network map.")
+            records = ({'hostname': dev.get('HostName'), 'ip': dev.get('IPAddress'), 'mac': dev.get('PhysAddress')}
+                       for dev in devices)
+            output.write_records(records, fmt, DEVICE_FIELDS, DEVICE_COLUMNS,
+                                 empty_message="No devices found on the network map.")
         except ModemError as e:
             print(f"Error retrieving device list: {e}", file=sys.stderr)
+
+    def list_history(self, identifier=None, limit=None, fmt='table'):
+        """Prints the recorded (MAC, IP, hostname) history, newest first. No modem traffic."""
+        if not self.history:
+            print("Error: Device history is disabled. Use --history-db to enable it.", file=sys.stderr)
+            return
+
+        rows = self.history.query(identifier, limit=limit)
+        empty_message = "No matching device history." if identifier else "No device history recorded yet."
+        output.write_records(rows, fmt, HISTORY_FIELDS, HISTORY_COLUMNS, empty_message=empty_message)
+
+    @staticmethod
+    def _emit(event, device, **extra):
+        record = {
+            'event': event,
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'mac': device.get('PhysAddress', ''),
+            'ip': device.get('IPAddress', ''),
+            'hostname': device.get('HostName', ''),
+        }
+        record.update(extra)
+        print(json.dumps(record), flush=True)
+
+    def watch(self, interval=5.0, max_interval=60.0):
+        """
+        Polls the host table over one session and prints join/leave/IP-change
+        events as NDJSON on stdout. Devices present at start are reported once
+        as 'present'. The poll interval resets to 'interval' after a change and
+        grows towards 'max_interval' while nothing changes. Unchanged payloads
+        are recognised by fingerprint and never re-parsed.
+        Runs until interrupted.
+        """
+        known = None
+        last_fingerprint = None
+        last_payload = None
+        current_interval = interval
+
+        while True:
+            try:
+                body = self.control.get_raw(HOSTS_OBJECT)
+                fingerprint = hashlib.sha256(body).hexdigest()
+
+                if fingerprint == last_fingerprint:
+                    self.control._log("Host table unchanged.")
+                    current_interval = min(max_interval, current_interval * WATCH_BACKOFF)
+                    if self.history:
+                        self.history.record_snapshot(last_payload)
+                else:
+                    last_payload = json.loads(body)
+                    if not isinstance(last_payload, dict):
+                        raise ValueError("Modem returned a non-object JSON payload.")
+                    devices = {d['PhysAddress'].lower(): d for d in self.parse_hosts(last_payload)}
+                    if self.history:
+                        self.history.record_snapshot(last_payload)
+                    changed = False
+
+                    if known is None:
+                        for device in devices.values():
+                            self._emit('present', device)
+                    else:
+                        for mac, device in devices.items():
+                            previous = known.get(mac)
+                            if previous is None:
+                                self._emit('join', device)
+                                changed = True
+                            elif previous.get('IPAddress') != device.get('IPAddress'):
+                                self._emit('ip_change', device, previous_ip=previous.get('IPAddress', ''))
+                                changed = True
+                        for mac, device in known.items():
+                            if mac not in devices:
+                                self._emit('leave', device)
+                                changed = True
+
+                    known = devices
+                    last_fingerprint = fingerprint
+                    if changed:
+                        current_interval = interval
+                    else:
+                        # Only fields we do not report changed (e.g. lease times)
+                        current_interval = min(max_interval, current_interval * WATCH_BACKOFF)
+
+            except (ModemError, ValueError) as e:
+                print(f"Error polling device list: {e}", file=sys.stderr)
+                # Long-running sessions can expire; log in again before the next poll.
+                # Login chatter goes to stderr so stdout stays pure NDJSON.
+                with contextlib.redirect_stdout(sys.stderr):
+                    self.control.login()
+
+            self.control._log(f"Next poll in {current_interval:.1f}s.")
+            self.control.sleep(current_interval)
@@ -0,0 +1,87 @@
+# MIT License
+#
+# Copyright (c) [Year] [Your Name or Handle]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import copy
+import datetime
+from .json_store import JSONStore
+
+GHOST_RULES_FILE = "ghost-rules.json"
+
+class GhostRuleStore(JSONStore):
+    """
+    Persists rules the modem refuses to delete ("ghost rules") across runs.
+    Entries are keyed by modem serial, then by rule number, MAC and URL, so a
+    reused rule number pointing at a different rule is never mistaken for a ghost.
+    """
+    def __init__(self, path=GHOST_RULES_FILE):
+        super().__init__(path)
+
+    @staticmethod
+    def key(rule):
+        return f"{rule['rule_num']}|{rule.get('mac', '')}|{rule.get('url', '')}"
+
+    def copy(self):
+        """Returns an in-memory copy whose changes are never written to disk."""
+        clone = GhostRuleStore(path=None)
+        clone._data = copy.deepcopy(self._load())
+        return clone
+
+    def is_empty(self):
+        return not any(self._load().values())
+
+    def entries(self, serial):
+        """Returns the list of known ghost entries for a modem."""
+        return list(self._load().get(serial, {}).values())
+
+    def contains(self, serial, rule):
+        return self.key(rule) in self._load().get(serial, {})
+
+    def record(self, serial, rule):
+        """Adds (or refreshes) a ghost entry, keeping its first-seen timestamp."""
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        ghosts = self._load().setdefault(serial, {})
+        entry = ghosts.setdefault(self.key(rule), {
+            'rule_num': str(rule['rule_num']),
+            'mac': rule.get('mac', ''),
+            'url': rule.get('url', ''),
+            'first_seen': now,
+        })
+        entry['last_seen'] = now
+        self._save()
+
+    def discard(self, serial, rule):
+        """Forgets a ghost entry. Returns True if it was known."""
+        ghosts = self._load().get(serial, {})
+        if ghosts.pop(self.key(rule), None) is None:
+            return False
+        if not ghosts:
+            del self._data[serial]
+        self._save()
+        return True
+
+    def clear(self, serial):
+        """Forgets every ghost entry for a modem. Returns the number removed."""
+        removed = len(self._load().pop(serial, {}))
+        if removed:
+            self._save()
+        return removed
@@ -0,0 +1,58 @@
+# MIT License
+#
+# Copyright (c) [Year] [Your Name or Handle]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import json
+
+class JSONStore:
+    """
+    Base for the small JSON files the tool keeps between runs. The file is
+    read lazily on first use and written atomically (temporary file, then
+    rename). They only hold things that can be rediscovered, so a missing or
+    damaged file reads as empty instead of failing the run.
+    path=None keeps the store in memory only.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            self._data = {}
+            if self.path is not None and os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        self._data = json.load(f)
+                except (OSError, ValueError):
+                    self._data = {}
+        return self._data
+
+    def _save(self):
+        if self.path is None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
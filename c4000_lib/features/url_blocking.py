@@ -21,28 +21,52 @@
 # SOFTWARE.
 
 import json
-import time
 import sys
+import hashlib
+import datetime
+import contextlib
 from urllib.parse import unquote
 from ..core import ModemError
+from .. import output
+from .ghost_rules import GhostRuleStore
+from .device_listing import HOSTS_OBJECT
 
 MAX_RETRIES = 3
+URL_FILTER_OBJECT = 'Device.Firewall.X_LANTIQ_COM_URLFilter'
+ENFORCE_BACKOFF = 2.0 # Poll interval multiplier while the rule table is stable
+SCHEDULE_MAX_SLEEP = 3600.0 # Re-read the clock at least this often while waiting (no modem traffic)
+MINUTES_PER_DAY = 24 * 60
+
+RULE_FIELDS = ['rule_num', 'mac', 'url', 'hostname', 'ip']
+GHOST_FIELDS = ['rule_num', 'mac', 'url', 'first_seen', 'last_seen']
+GHOST_COLUMNS = [
+    output.Column('Rule #', 'rule_num', 8),
+    output.Column('Applied To', lambda g: g['mac'] or "All LAN Devices", 20),
+    output.Column('First Seen', 'first_seen', 20),
+    output.Column('Last Seen', 'last_seen', 20),
+    output.Column('Blocked URL', 'url'),
+]
 
 class URLBlockingFeature:
     """Handles all logic for URL blocking rules using state enforcement."""
-    def __init__(self, control, device_feature):
+    def __init__(self, control, device_feature, ghost_store=None):
         self.control = control
         self.device_feature = device_feature
+        self.ghost_store = ghost_store if ghost_store is not None else GhostRuleStore()
 
-    def get_rules(self):
-        """
-        Fetches and parses all URL filtering rules.
-        Returns: (list of rules, raw_data)
-        Raises: ModemError if fetching fails.
-        """
-        self.control._log("Querying modem for current rules...")
-        raw_data = self.control.get_request('Device.Firewall.X_LANTIQ_COM_URLFilter')
+    def _modem_serial(self):
+        """Serial number used to key the ghost store. Raises ModemError."""
+        return self.control.get_identity()[1]
+
+    def _is_ghost(self, rule):
+        """True if the rule is a known ghost. Costs no modem traffic while the store is empty."""
+        if self.ghost_store.is_empty():
+            return False
+        return self.ghost_store.contains(self._modem_serial(), rule)
 
+    @staticmethod
+    def parse_rules(raw_data):
+        """Parses a raw URL filter response into a list of rules."""
         rules_list = []
         for item in raw_data.get('Objects', []):
             if "Rule" in item.get('ObjName', ''):
@@ -62,15 +86,31 @@ class URLBlockingFeature:
                         rules_list.append(rule_info)
                 except (IndexError, KeyError):
                     continue
+        return rules_list
+
+    def get_rules(self, raw_data=None):
+        """
+        Fetches and parses all URL filtering rules.
+        raw_data: an already fetched response to parse instead of querying the modem.
+        Returns: (list of rules, raw_data)
+        Raises: ModemError if fetching fails.
+        """
+        if raw_data is None:
+            self.control._log("Querying modem for current rules...")
+            raw_data = self.control.get_request(URL_FILTER_OBJECT)
+
+        rules_list = self.parse_rules(raw_data)
 
         self.control._log(f"Parsed {len(rules_list)} rules.")
         return rules_list, raw_data
 
-    def _resolve_device_to_mac(self, device_identifier):
+    def _resolve_device_to_mac(self, device_identifier, devices=None):
+        """devices: an already fetched device list; fetched here if None."""
         if device_identifier.lower() == 'all':
             return ""
 
-        devices, _ = self.device_feature.get_all() # May raise ModemError
+        if devices is None:
+            devices, _ = self.device_feature.get_all() # May raise ModemError
 
         identifier_lower = device_identifier.lower()
         for device in devices:
@@ -82,14 +122,44 @@ class URLBlockingFeature:
                (name and name.lower() == identifier_lower):
                 return mac
 
+        # Offline devices drop out of the host table; fall back to the local history.
+        history = self.device_feature.history
+        if history:
+            row = history.lookup(device_identifier)
+            if row:
+                print(f"Notice: '{device_identifier}' is not on the network map. "
+                      f"Using {row['mac']} from device history (last seen {row['last_seen']}).")
+                return row['mac']
+
         print(f"Error: Could not find any device matching '{device_identifier}'.", file=sys.stderr)
         return None
 
-    def list_rules(self, debug=False):
-        """Prints a formatted list of URL blocking rules."""
-        try:
-            rules_list, raw_data = self.get_rules()
+    def _resolve_device_ids(self, device_ids, devices=None):
+        """
+        Resolves each distinct identifier once, all against a single fetch of
+        the device table (skipped when every identifier is 'all').
+        devices: an already fetched device list to resolve against.
+        Returns: {identifier: mac} for every identifier that could be resolved.
+        Raises: ModemError if the device table cannot be fetched.
+        """
+        device_ids = set(device_ids)
+        if devices is None and any(uid.lower() != 'all' for uid in device_ids):
             devices, _ = self.device_feature.get_all()
+
+        mac_cache = {}
+        for uid in device_ids:
+            mac = self._resolve_device_to_mac(uid, devices)
+            if mac is not None:
+                mac_cache[uid] = mac
+        return mac_cache
+
+    def list_rules(self, debug=False, fmt='table'):
+        """Prints the URL blocking rules as a table or streams them as JSON/NDJSON/CSV."""
+        try:
+            # The two tables are independent, so they can be fetched together.
+            snapshot = self.control.get_many([URL_FILTER_OBJECT, HOSTS_OBJECT])
+            rules_list, raw_data = self.get_rules(raw_data=snapshot[URL_FILTER_OBJECT])
+            devices, _ = self.device_feature.get_all(raw_data=snapshot[HOSTS_OBJECT])
             device_lookup = {dev['PhysAddress']: dev for dev in devices if dev.get('PhysAddress')} if devices else {}
 
             if debug:
@@ -97,25 +167,42 @@ class URLBlockingFeature:
                 print(json.dumps(raw_data, indent=2), file=sys.stderr)
                 print("--- End Raw Response ---\n", file=sys.stderr)
 
-            if rules_list:
-                print(f"{'Rule #':<8} {'Applied To':<40} {'Blocked URL'}")
-                print(f"{'-'*8} {'-'*40} {'-'*20}")
-                for rule in rules_list:
-                    mac = rule.get('mac')
-                    device_str = "Unknown"
-                    if not mac:
-                        device_str = "All LAN Devices"
-                    elif mac in device_lookup:
-                        dev = device_lookup[mac]
-                        device_str = f"{dev.get('HostName', 'N/A')} ({dev.get('IPAddress', 'N/A')})"
-                    else:
-                        device_str = mac
-                    print(f"{rule['rule_num']:<8} {device_str:<40} {rule['url']}")
-            else:
-                print("No URL filtering rules are currently configured.")
+            def applied_to(record):
+                mac = record.get('mac')
+                if not mac:
+                    return "All LAN Devices"
+                if mac in device_lookup:
+                    dev = device_lookup[mac]
+                    return f"{dev.get('HostName', 'N/A')} ({dev.get('IPAddress', 'N/A')})"
+                return mac
+
+            columns = [
+                output.Column('Rule #', 'rule_num', 8),
+                output.Column('Applied To', applied_to, 40),
+                output.Column('Blocked URL', 'url'),
+            ]
+            records = (dict(rule,
+                            hostname=device_lookup.get(rule.get('mac'), {}).get('HostName'),
+                            ip=device_lookup.get(rule.get('mac'), {}).get('IPAddress'))
+                       for rule in rules_list)
+            output.write_records(records, fmt, RULE_FIELDS, columns,
+                                 empty_message="No URL filtering rules are currently configured.")
         except ModemError as e:
             print(f"Failed to list rules: {e}", file=sys.stderr)
 
+    @staticmethod
+    def _add_payload(domain, mac_address):
+        return {
+            'Object': 'Device.Firewall.X_LANTIQ_COM_URLFilter.Rule',
+            'Operation': 'Add',
+            'URL': f"http://{domain}",
+            'MACAddress': mac_address
+        }
+
+    @staticmethod
+    def _delete_payload(rule_id):
+        return {'Object': f"Device.Firewall.X_LANTIQ_COM_URLFilter.Rule.{rule_id}.", 'Operation': 'Del'}
+
     def _ensure_rule_state(self, domain, mac_address, desired_state):
         """
         Idempotent function to ensure a rule exists or is removed.
@@ -140,8 +227,13 @@ class URLBlockingFeature:
                         return True
                     elif len(matching_rules) > 1:
                         print(f"Notice: Found {len(matching_rules)} duplicate rules for {target_desc}. Cleaning up...")
-                        # Remove all but the first one
+                        # Keep a known ghost as the survivor (it cannot be deleted anyway)
+                        # and remove all the others.
+                        matching_rules.sort(key=lambda r: not self._is_ghost(r))
                         for rule in matching_rules[1:]:
+                            if self._is_ghost(rule):
+                                print(f"Skipping known ghost Rule #{rule['rule_num']}.")
+                                continue
                             self.remove_by_id(rule['rule_num'])
                         return True
 
@@ -151,17 +243,20 @@ class URLBlockingFeature:
                         print(f"{msg}")
                         return True
 
+                    # Known ghosts are not worth another round of delete attempts.
+                    ghost_rules = [r for r in matching_rules if self._is_ghost(r)]
+                    matching_rules = [r for r in matching_rules if not self._is_ghost(r)]
+                    if not matching_rules:
+                        ids = ", ".join(f"#{r['rule_num']}" for r in ghost_rules)
+                        print(f"Warning: Only known ghost rules remain for {target_desc} ({ids}). Skipping. "
+                              f"Use 'url ghosts --probe' to retry them.", file=sys.stderr)
+                        return False
+
                 # 3. Perform Action
                 print(f"Attempting to {action_desc} rule {target_desc} (Attempt {attempt})...")
 
                 if desired_state == 'present':
-                    payload = {
-                        'Object': 'Device.Firewall.X_LANTIQ_COM_URLFilter.Rule',
-                        'Operation': 'Add',
-                        'URL': f"http://{domain}",
-                        'MACAddress': mac_address
-                    }
-                    self.control.set_request(payload)
+                    self.control.set_request(self._add_payload(domain, mac_address))
                 else:
                     # For removal, take the FIRST match and delete it.
                     # If duplicates exist, the outer loop/verification will catch them on the next pass.
@@ -170,61 +265,168 @@ class URLBlockingFeature:
 
             except ModemError as e:
                 print(f"Modem error during {action_desc}: {e}", file=sys.stderr)
-                time.sleep(2.0) # Extra backoff
+                self.control.sleep(2.0) # Extra backoff
 
         print(f"FAILURE: Could not {action_desc} rule {target_desc} after {MAX_RETRIES} attempts.", file=sys.stderr)
         return False
 
-    def add(self, rules_to_add, **kwargs):
-        """Iterates through rules and ensures they exist."""
-        unique_device_ids = {device_id for device_id, domain in rules_to_add}
-        mac_cache = {}
+    @staticmethod
+    def _known_macs(devices):
+        """MAC addresses of every device in a host table listing."""
+        return {device['PhysAddress'] for device in devices if device.get('PhysAddress')}
 
-        try:
-            for uid in unique_device_ids:
-                mac = self._resolve_device_to_mac(uid)
-                if mac is not None:
-                    mac_cache[uid] = mac
-        except ModemError as e:
-            print(f"Fatal error resolving devices: {e}", file=sys.stderr)
-            return
+    def _resolve_pairs(self, rules, devices=None):
+        """
+        Resolves (device_id, domain) rules into unique (mac, domain) pairs, in order.
+        Unresolved devices are reported and skipped.
+        Raises: ModemError if the device table cannot be fetched.
+        """
+        mac_cache = self._resolve_device_ids((device_id for device_id, domain in rules), devices)
 
-        for device_id, domain in rules_to_add:
+        pairs = []
+        for device_id, domain in rules:
             mac_address = mac_cache.get(device_id)
             if mac_address is None:
                 print(f"Skipping rule for unresolved device '{device_id}'.")
                 continue
+            pairs.append((mac_address, domain))
 
-            self._ensure_rule_state(domain, mac_address, 'present')
-
-    def remove(self, rules_to_remove, **kwargs):
-        """Iterates through rules and ensures they are removed."""
-        unique_device_ids = {device_id for device_id, domain in rules_to_remove}
-        mac_cache = {}
+        # Different identifiers (hostname, IP, group member) may name the same device.
+        unique = list(dict.fromkeys(pairs))
+        if len(unique) < len(pairs):
+            self.control._log(f"Dropped {len(pairs) - len(unique)} duplicate rules after resolution.")
+        return unique
 
+    def _compact_domain(self, domain, rules, known_macs, extra_macs=()):
+        """
+        Replaces the per-device rules for one domain with a single all-devices
+        (empty MAC) rule when, together with extra_macs, they cover every known
+        device. The new rule is added before the old ones are removed, so the
+        domain is never left unblocked.
+        Returns True if the domain is covered by an all-devices rule afterwards.
+        """
+        macs = {r.get('mac', '') for r in rules if r['url'] == domain}
+        if '' not in macs:
+            if not known_macs or not known_macs <= macs | set(extra_macs):
+                return False
+            print(f"Compacting '{domain}': it is blocked for all {len(known_macs)} known devices. "
+                  f"Replacing the per-device rules with one rule for all devices...")
+            if not self._ensure_rule_state(domain, '', 'present'):
+                return False
+        for mac in sorted(macs - {''}):
+            print(f"Removing per-device rule for '{domain}' ({mac}), now covered by the all-devices rule...")
+            self._ensure_rule_state(domain, mac, 'absent')
+        return True
+
+    def _expand_domain(self, domain, rules, known_macs, exempt_macs):
+        """
+        Undoes compaction for one domain: the all-devices rule is replaced by
+        per-device rules for every known device except exempt_macs. The new
+        rules are added first; the all-devices rule is kept if any of them fails.
+        """
+        if not any(r['url'] == domain and not r.get('mac') for r in rules):
+            return
+        keep = sorted(known_macs - set(exempt_macs))
+        print(f"Expanding the all-devices rule for '{domain}' into {len(keep)} per-device rules "
+              f"to exempt {len(exempt_macs)} device(s)...")
+        results = [self._ensure_rule_state(domain, mac, 'present') for mac in keep]
+        if all(results):
+            self._ensure_rule_state(domain, '', 'absent')
+        else:
+            print(f"Warning: Keeping the all-devices rule for '{domain}' because some per-device rules "
+                  f"could not be added.", file=sys.stderr)
+
+    @staticmethod
+    def _group_by_domain(pairs):
+        by_domain = {}
+        for mac, domain in pairs:
+            by_domain.setdefault(domain, set()).add(mac)
+        return by_domain
+
+    def add(self, rules_to_add, compact=False, **kwargs):
+        """
+        Iterates through rules and ensures they exist.
+        With compact, a domain that ends up blocked for every known device is
+        stored as a single all-devices rule instead of one rule per device.
+        """
         try:
-            for uid in unique_device_ids:
-                mac = self._resolve_device_to_mac(uid)
-                if mac is not None:
-                    mac_cache[uid] = mac
+            devices = self.device_feature.get_all()[0] if compact else None
+            pairs = self._resolve_pairs(rules_to_add, devices)
         except ModemError as e:
             print(f"Fatal error resolving devices: {e}", file=sys.stderr)
             return
 
-        for device_id, domain in rules_to_remove:
-            mac_address = mac_cache.get(device_id)
-            if mac_address is None:
-                print(f"Skipping rule removal for unresolved device '{device_id}'.")
+        covered = set()
+        if compact:
+            try:
+                rules, _ = self.get_rules()
+                known_macs = self._known_macs(devices)
+                for domain, macs in self._group_by_domain(pairs).items():
+                    if self._compact_domain(domain, rules, known_macs, macs):
+                        covered.add(domain)
+            except ModemError as e:
+                print(f"Error while compacting rules: {e}", file=sys.stderr)
+
+        for mac_address, domain in pairs:
+            if domain in covered:
                 continue
+            self._ensure_rule_state(domain, mac_address, 'present')
+        if covered:
+            print(f"{len(covered)} domain(s) are covered by all-devices rules.")
+
+    def remove(self, rules_to_remove, compact=False, **kwargs):
+        """
+        Iterates through rules and ensures they are removed.
+        With compact, removing a device from a domain that is blocked by an
+        all-devices rule expands that rule back into per-device rules for the
+        remaining devices, so the device is actually exempted.
+        """
+        try:
+            devices = self.device_feature.get_all()[0] if compact else None
+            pairs = self._resolve_pairs(rules_to_remove, devices)
+        except ModemError as e:
+            print(f"Fatal error resolving devices: {e}", file=sys.stderr)
+            return
+
+        if compact:
+            try:
+                rules, _ = self.get_rules()
+                known_macs = self._known_macs(devices)
+                exemptions = self._group_by_domain((mac, domain) for mac, domain in pairs if mac)
+                for domain, macs in exemptions.items():
+                    self._expand_domain(domain, rules, known_macs, macs)
+            except ModemError as e:
+                print(f"Error while expanding rules: {e}", file=sys.stderr)
 
+        for mac_address, domain in pairs:
             self._ensure_rule_state(domain, mac_address, 'absent')
 
+    def compact(self, **kwargs):
+        """Compacts the existing rule table: every domain blocked for all known devices becomes one rule."""
+        try:
+            rules, _ = self.get_rules()
+            known_macs = self._known_macs(self.device_feature.get_all()[0])
+            candidates = sorted({r['url'] for r in rules if r.get('mac')})
+            compacted = [domain for domain in candidates if self._compact_domain(domain, rules, known_macs)]
+            if compacted:
+                print(f"Compaction complete: {len(compacted)} domain(s) now use a single all-devices rule.")
+            else:
+                print("Nothing to compact.")
+        except ModemError as e:
+            print(f"Error during compaction: {e}", file=sys.stderr)
+
     def remove_by_id(self, rule_id, **kwargs):
         """
         Removes a single rule by its ID number and verifies removal.
+        Known ghost rules get a single probe instead of the full retry budget.
         Returns True if successful, False if failed (Ghost Rule).
         """
-        for attempt in range(1, MAX_RETRIES + 1):
+        max_attempts = MAX_RETRIES
+        target_rule = None
+
+        attempt = 0
+        while attempt < max_attempts:
+            attempt += 1
             try:
                 # Verify existence first
                 rules, _ = self.get_rules()
@@ -234,18 +436,34 @@ class URLBlockingFeature:
                     print(f"Rule #{rule_id} is gone.")
                     return True
 
+                if attempt == 1 and self._is_ghost(target_rule):
+                    print(f"Rule #{rule_id} is a known ghost rule. Probing once...")
+                    max_attempts = 1
+
                 print(f"Sending request to REMOVE Rule #{rule_id} (Attempt {attempt})...")
-                payload = {'Object': f"Device.Firewall.X_LANTIQ_COM_URLFilter.Rule.{rule_id}.", 'Operation': 'Del'}
-                self.control.set_request(payload)
+                self.control.set_request(self._delete_payload(rule_id))
 
             except ModemError as e:
                 print(f"Error removing rule #{rule_id}: {e}", file=sys.stderr)
 
+        # Verify the final attempt too, so a late success is never quarantined.
+        try:
+            rules, _ = self.get_rules()
+            if not any(r['rule_num'] == str(rule_id) for r in rules):
+                print(f"Rule #{rule_id} is gone.")
+                if target_rule and self.ghost_store.discard(self._modem_serial(), target_rule):
+                    print(f"Rule #{rule_id} removed from the ghost rule list.")
+                return True
+            if target_rule:
+                self.ghost_store.record(self._modem_serial(), target_rule)
+        except ModemError as e:
+            print(f"Error verifying removal of rule #{rule_id}: {e}", file=sys.stderr)
+
         print(f"Failed to verify removal of Rule #{rule_id} after multiple attempts.", file=sys.stderr)
         return False
 
     def remove_all(self, **kwargs):
-        """Removes all URL blocking rules safely, skipping stuck rules."""
+        """Removes all URL blocking rules safely, skipping stuck and known ghost rules."""
         stuck_rules = set()
 
         try:
@@ -253,12 +471,15 @@ class URLBlockingFeature:
                 rules_list, _ = self.get_rules()
 
                 # Filter out known stuck rules so we don't loop infinitely
-                actionable_rules = [r for r in rules_list if r['rule_num'] not in stuck_rules]
+                known_ghosts = [r for r in rules_list if self._is_ghost(r)]
+                actionable_rules = [r for r in rules_list if r['rule_num'] not in stuck_rules and r not in known_ghosts]
 
                 if not actionable_rules:
-                    if stuck_rules:
-                        print(f"Warning: {len(stuck_rules)} ghost rules could not be removed and were skipped.")
-                        print(f"Stuck Rule IDs: {stuck_rules}")
+                    skipped = stuck_rules | {r['rule_num'] for r in known_ghosts}
+                    if skipped:
+                        print(f"Warning: {len(skipped)} ghost rules could not be removed and were skipped.")
+                        print(f"Stuck Rule IDs: {skipped}")
+                        print("Use 'url ghosts --probe' to retry them.")
                     else:
                         print("No rules remaining.")
                     break
@@ -278,8 +499,285 @@ class URLBlockingFeature:
                     stuck_rules.add(rule_id)
                 else:
                     # Allow a slight breather between successful deletes
-                    time.sleep(1.0)
+                    self.control.sleep(1.0)
 
             print("Remove all operation complete.")
         except ModemError as e:
             print(f"Error during bulk removal: {e}", file=sys.stderr)
+
+    @staticmethod
+    def _rule_set_hash(pairs):
+        """Order-independent fingerprint of a set of (mac, url) pairs."""
+        return hashlib.sha256(json.dumps(sorted(pairs)).encode('utf-8')).hexdigest()
+
+    def enforce(self, policy_rules, interval=60.0, max_interval=900.0, prune=False, once=False, **kwargs):
+        """
+        Keeps the modem's rule table in line with a policy until interrupted.
+        Each poll fetches the raw table; if its fingerprint matches the last
+        table found compliant nothing is parsed. Otherwise the normalized rule
+        set is hashed and compared with the policy, and only the missing rules
+        (plus, with prune, rules not in the policy other than known ghosts) are
+        corrected via _ensure_rule_state.
+        The poll interval doubles up to max_interval while nothing drifts.
+        once: run a single check (and correction) and return, e.g. for --plan.
+        """
+        try:
+            desired = set(self._resolve_pairs(policy_rules))
+        except ModemError as e:
+            print(f"Fatal error resolving devices: {e}", file=sys.stderr)
+            return
+
+        desired_hash = self._rule_set_hash(desired)
+
+        print(f"Enforcing {len(desired)} rules every {interval:g}s (up to {max_interval:g}s while stable)"
+              f"{', removing rules not in the policy' if prune else ''}. Press Ctrl+C to stop.")
+
+        last_fingerprint = None
+        current_interval = interval
+
+        while True:
+            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            try:
+                body = self.control.get_raw(URL_FILTER_OBJECT)
+                fingerprint = hashlib.sha256(body).hexdigest()
+
+                if fingerprint == last_fingerprint:
+                    self.control._log("Rule table unchanged since last check.")
+                    current_interval = min(max_interval, current_interval * ENFORCE_BACKOFF)
+                else:
+                    payload = json.loads(body)
+                    if not isinstance(payload, dict):
+                        raise ValueError("Modem returned a non-object JSON payload.")
+                    rules = self.parse_rules(payload)
+                    current = {(r.get('mac', ''), r['url']) for r in rules}
+                    if prune:
+                        # Known ghosts cannot be pruned; retrying them every poll achieves nothing.
+                        current -= {(r.get('mac', ''), r['url']) for r in rules if self._is_ghost(r)} - desired
+                    relevant = current if prune else current & desired
+
+                    if self._rule_set_hash(relevant) == desired_hash:
+                        self.control._log("Rule table changed but still matches the policy.")
+                        # Only a compliant table may be skipped by fingerprint later on.
+                        last_fingerprint = fingerprint
+                        current_interval = min(max_interval, current_interval * ENFORCE_BACKOFF)
+                    else:
+                        missing = desired - current
+                        unexpected = (current - desired) if prune else set()
+                        print(f"[{timestamp}] Drift detected: {len(missing)} missing, {len(unexpected)} unexpected. Correcting...")
+                        # In a batch, earlier steps may have left a stale snapshot of the table.
+                        self.control.invalidate_cache()
+                        results = [self._ensure_rule_state(domain, mac, 'present') for mac, domain in sorted(missing)]
+                        results += [self._ensure_rule_state(domain, mac, 'absent') for mac, domain in sorted(unexpected)]
+                        failed = results.count(False)
+                        if failed:
+                            print(f"[{timestamp}] Correction incomplete: {failed} rule(s) could not be corrected. "
+                                  f"Retrying at the next check.", file=sys.stderr)
+                        else:
+                            print(f"[{timestamp}] Correction pass complete.")
+                        current_interval = interval
+
+            except (ModemError, ValueError) as e:
+                print(f"[{timestamp}] Error checking rules: {e}", file=sys.stderr)
+                # Long-running sessions can expire; log in again before the next poll.
+                self.control.login()
+
+            if once:
+                return
+            self.control._log(f"Next check in {current_interval:.1f}s.")
+            self.control.sleep(current_interval)
+
+    @staticmethod
+    def _window_active(start, end, minute):
+        """True if minute-of-day lies in [start, end). end < start wraps past midnight; start == end is all day."""
+        if start == end:
+            return True
+        if start < end:
+            return start <= minute < end
+        return minute >= start or minute < end
+
+    @classmethod
+    def _active_pairs(cls, windows, minute):
+        return {(mac, domain) for start, end, mac, domain in windows if cls._window_active(start, end, minute)}
+
+    @classmethod
+    def compile_schedule(cls, windows):
+        """
+        Compiles daily (start_minute, end_minute, mac, domain) windows into a
+        timeline sorted by minute of day: [(minute, adds, removes), ...].
+        Each entry is the exact change between the state just before and just
+        after that minute, so overlapping windows never cause redundant writes.
+        """
+        boundaries = sorted({minute for start, end, _, _ in windows if start != end for minute in (start, end)})
+        states = [(minute, cls._active_pairs(windows, minute)) for minute in boundaries]
+
+        timeline = []
+        for i, (minute, state) in enumerate(states):
+            previous = states[i - 1][1] # The day wraps, so the first boundary follows the last
+            adds, removes = state - previous, previous - state
+            if adds or removes:
+                timeline.append((minute, sorted(adds), sorted(removes)))
+        return timeline
+
+    @staticmethod
+    def _next_transition(timeline, now):
+        """Returns (datetime, adds, removes) of the first transition after now."""
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        for day in (0, 1):
+            for minute, adds, removes in timeline:
+                at = midnight + datetime.timedelta(days=day, minutes=minute)
+                if at > now:
+                    return at, adds, removes
+        raise ValueError("Empty schedule timeline")
+
+    def _apply_delta(self, adds, removes):
+        """
+        Applies (mac, domain) additions and removals as one batch: one snapshot,
+        only the writes it shows are needed, then one verification read.
+        Anything still out of place falls back to _ensure_rule_state.
+        Raises: ModemError if the modem cannot be read.
+        """
+        rules, _ = self.get_rules()
+        present = {(r.get('mac', ''), r['url']) for r in rules}
+        to_add = [pair for pair in adds if pair not in present]
+        to_delete = [r for r in rules if (r.get('mac', ''), r['url']) in set(removes) and not self._is_ghost(r)]
+
+        if not (to_add or to_delete):
+            print("OK: Rules already match the schedule.")
+            return
+
+        for mac, domain in to_add:
+            print(f"Adding '{domain}' for {mac or 'All LAN Devices'}...")
+            self.control.set_request(self._add_payload(domain, mac))
+        for rule in to_delete:
+            print(f"Removing Rule #{rule['rule_num']} ('{rule['url']}' for {rule.get('mac') or 'All LAN Devices'})...")
+            self.control.set_request(self._delete_payload(rule['rule_num']))
+
+        rules, _ = self.get_rules()
+        present = {(r.get('mac', ''), r['url']) for r in rules}
+        for mac, domain in adds:
+            if (mac, domain) not in present:
+                self._ensure_rule_state(domain, mac, 'present')
+        for mac, domain in removes:
+            if (mac, domain) in present:
+                self._ensure_rule_state(domain, mac, 'absent')
+        print(f"Applied {len(to_add)} additions and {len(to_delete)} removals.")
+
+    def _apply_with_retry(self, adds, removes):
+        """Runs _apply_delta, logging in again after a modem error (the session may have expired while idle)."""
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                # A batch may hold a snapshot from hours ago; always decide from a fresh read.
+                self.control.invalidate_cache()
+                self._apply_delta(adds, removes)
+                return True
+            except ModemError as e:
+                print(f"Modem error while applying the schedule (Attempt {attempt}): {e}", file=sys.stderr)
+                self.control.login()
+        print(f"FAILURE: Could not apply the scheduled changes after {MAX_RETRIES} attempts.", file=sys.stderr)
+        return False
+
+    def schedule(self, entries, once=False, **kwargs):
+        """
+        Applies a daily blocking schedule until interrupted.
+        entries: (start_minute, end_minute, device_id, domain) windows.
+        Devices are resolved once and the schedule is compiled into a timeline
+        of transitions. After an initial sync the runner sleeps until each
+        transition and applies only its delta; nothing is sent in between.
+        once: stop after the initial sync, e.g. for --plan.
+        """
+        try:
+            mac_cache = self._resolve_device_ids(device_id for _, _, device_id, _ in entries)
+        except ModemError as e:
+            print(f"Fatal error resolving devices: {e}", file=sys.stderr)
+            return
+
+        windows = []
+        for start, end, device_id, domain in entries:
+            if device_id not in mac_cache:
+                print(f"Skipping schedule entry for unresolved device '{device_id}'.")
+                continue
+            windows.append((start, end, mac_cache[device_id], domain))
+        windows = list(dict.fromkeys(windows))
+        if not windows:
+            print("Nothing to schedule.")
+            return
+
+        timeline = self.compile_schedule(windows)
+        scheduled = {(mac, domain) for _, _, mac, domain in windows}
+        print(f"Compiled {len(windows)} schedule entries into {len(timeline)} daily transitions:")
+        for minute, adds, removes in timeline:
+            print(f"  {minute // 60:02d}:{minute % 60:02d}  block {len(adds)}, unblock {len(removes)}")
+
+        # Bring the modem in line with the current time slot once.
+        now = datetime.datetime.now()
+        active = self._active_pairs(windows, now.hour * 60 + now.minute)
+        print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] Initial sync: {len(active)} of {len(scheduled)} scheduled rules active.")
+        self._apply_with_retry(sorted(active), sorted(scheduled - active))
+
+        if once:
+            return
+        if not timeline:
+            print("The schedule has no transitions (every entry is all day). Nothing more to do.")
+            return
+
+        # The time the modem state was last computed for. Transitions due after
+        # it may pass while an apply is still running; those must not be skipped.
+        synced_at = now
+        while True:
+            at, adds, removes = self._next_transition(timeline, synced_at)
+            now = datetime.datetime.now()
+            if at <= now:
+                active = self._active_pairs(windows, now.hour * 60 + now.minute)
+                print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] The transition at {at.strftime('%H:%M')} passed while applying. Re-syncing the whole schedule...")
+                self._apply_with_retry(sorted(active), sorted(scheduled - active))
+                synced_at = now
+                continue
+
+            print(f"Next transition at {at.strftime('%Y-%m-%d %H:%M')}: block {len(adds)}, unblock {len(removes)}. Press Ctrl+C to stop.")
+            while True:
+                remaining = (at - datetime.datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+                self.control.sleep(min(remaining, SCHEDULE_MAX_SLEEP))
+
+            now = datetime.datetime.now()
+            if (now - at).total_seconds() > 60:
+                # Woke up late (e.g. the host was suspended); later transitions may have passed too.
+                active = self._active_pairs(windows, now.hour * 60 + now.minute)
+                print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] Missed the transition time. Re-syncing the whole schedule...")
+                self._apply_with_retry(sorted(active), sorted(scheduled - active))
+                synced_at = now
+            else:
+                print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] Applying transition...")
+                self._apply_with_retry(adds, removes)
+                synced_at = at
+
+    def ghosts(self, probe=False, clear=False, fmt='table', **kwargs):
+        """Lists known ghost rules for this modem, optionally re-probing or forgetting them."""
+        try:
+            serial = self._modem_serial()
+
+            if clear:
+                removed = self.ghost_store.clear(serial)
+                print(f"Forgot {removed} ghost rules for modem {serial}.")
+                return
+
+            # Probe progress must not end up in machine-readable output
+            progress = sys.stdout if fmt == 'table' else sys.stderr
+            if probe and self.ghost_store.entries(serial):
+                with contextlib.redirect_stdout(progress):
+                    rules, _ = self.get_rules()
+                    current_keys = {GhostRuleStore.key(r) for r in rules}
+                    for ghost in self.ghost_store.entries(serial):
+                        if GhostRuleStore.key(ghost) not in current_keys:
+                            print(f"Rule #{ghost['rule_num']} ({ghost['url']}) no longer exists. Forgetting it.")
+                            self.ghost_store.discard(serial, ghost)
+                            continue
+                        print(f"Re-probing ghost Rule #{ghost['rule_num']} ({ghost['url']})...")
+                        self.remove_by_id(ghost['rule_num'])
+
+            entries = sorted(self.ghost_store.entries(serial), key=lambda g: int(g['rule_num']))
+            output.write_records(entries, fmt, GHOST_FIELDS, GHOST_COLUMNS,
+                                 empty_message=f"No known ghost rules for modem {serial}.")
+        except ModemError as e:
+            print(f"Failed to process ghost rules: {e}", file=sys.stderr)
@@ -0,0 +1,128 @@
+# MIT License
+#
+# Copyright (c) [Year] [Your Name or Handle]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import csv
+import sys
+import json
+
+FORMATS = ('table', 'json', 'ndjson', 'csv')
+
+class Column:
+    """
+    One column of a fixed-width table.
+    render: record key, or a callable taking the record and returning the cell text.
+    width: pad to this width (None for a free-running last column).
+    rule: length of the dashed line under the title (defaults to width).
+    """
+    def __init__(self, title, render, width=None, rule=None):
+        self.title = title
+        self.render = render
+        self.width = width
+        self.rule = rule or width or 20
+
+    def cell(self, record):
+        value = self.render(record) if callable(self.render) else record.get(self.render, '')
+        return str(value)
+
+class TableWriter:
+    """The classic fixed-width console table. Prints 'empty_message' instead if there are no records."""
+    def __init__(self, stream, fields, columns, empty_message):
+        self.stream = stream
+        self.columns = columns
+        self.empty_message = empty_message
+        self.count = 0
+
+    def _line(self, cells):
+        parts = [f"{cell:<{col.width}}" if col.width else cell for col, cell in zip(self.columns, cells)]
+        print(" ".join(parts), file=self.stream)
+
+    def write(self, record):
+        if self.count == 0:
+            self._line([col.title for col in self.columns])
+            self._line(['-' * col.rule for col in self.columns])
+        self._line([col.cell(record) for col in self.columns])
+        self.count += 1
+
+    def close(self):
+        if self.count == 0 and self.empty_message:
+            print(self.empty_message, file=self.stream)
+
+class NDJSONWriter:
+    """One JSON object per line, flushed as it is written."""
+    def __init__(self, stream, fields, columns=None, empty_message=None):
+        self.stream = stream
+        self.fields = fields
+
+    def write(self, record):
+        self.stream.write(json.dumps({f: record.get(f) for f in self.fields}) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+class JSONWriter:
+    """A single JSON array, written element by element so nothing is buffered."""
+    def __init__(self, stream, fields, columns=None, empty_message=None):
+        self.stream = stream
+        self.fields = fields
+        self.count = 0
+
+    def write(self, record):
+        self.stream.write("[\n  " if self.count == 0 else ",\n  ")
+        self.stream.write(json.dumps({f: record.get(f) for f in self.fields}))
+        self.count += 1
+
+    def close(self):
+        self.stream.write("\n]\n" if self.count else "[]\n")
+        self.stream.flush()
+
+class CSVWriter:
+    """CSV with a header row of the raw field names."""
+    def __init__(self, stream, fields, columns=None, empty_message=None):
+        self.writer = csv.DictWriter(stream, fieldnames=fields, extrasaction='ignore', lineterminator="\n")
+        self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(record)
+
+    def close(self):
+        pass
+
+WRITERS = {'table': TableWriter, 'json': JSONWriter, 'ndjson': NDJSONWriter, 'csv': CSVWriter}
+
+def write_records(records, fmt, fields, columns, empty_message=None, stream=None):
+    """
+    Streams an iterable of record dicts to stdout in the requested format.
+    fields: raw keys emitted by the machine-readable formats.
+    columns: Column list used by the table format.
+    Returns the number of records written.
+    """
+    writer = WRITERS[fmt](stream or sys.stdout, fields, columns, empty_message)
+    count = 0
+    try:
+        for record in records:
+            writer.write(record)
+            count += 1
+    finally:
+        writer.close()
+    return count
@@ -0,0 +1,185 @@
+# MIT License
+#
+# Copyright (c) [Year] [Your Name or Handle]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import io
+import sys
+import json
+import contextlib
+from urllib.parse import unquote
+
+from . import utils
+from .core import DEFAULT_POST_WRITE_DELAY
+from .features.device_listing import DeviceListingFeature
+from .features.url_blocking import URLBlockingFeature, URL_FILTER_OBJECT
+
+class DryRunControl:
+    """
+    Stands in for ModemControl while planning.
+    Each object is read from the modem once (the snapshot). Writes are applied
+    to an in-memory copy of the URL filter table instead of the modem, and every
+    request the feature code would send is recorded in order.
+    """
+    def __init__(self, control, ghost_store):
+        self.control = control
+        self.ghost_store = ghost_store
+        self.debug = control.debug
+        self.min_interval = control.min_interval
+        self.steps = []
+        self.actions = []
+        self._snapshot = {}
+        self._next_rule_num = 1
+        # Objects a real run would serve from the session's snapshot cache
+        self._cached = set(control._read_cache) if control.cache_reads else set()
+
+    def _log(self, message):
+        self.control._log(message)
+
+    def sleep(self, seconds):
+        self.steps.append(seconds)
+
+    def login(self):
+        return True
+
+    def invalidate_cache(self):
+        self._cached.clear()
+
+    def get_raw(self, object_path):
+        # Never cached, like ModemControl.get_raw()
+        self.steps.append('GET')
+        return json.dumps(self._get_snapshot(object_path)).encode('utf-8')
+
+    def get_identity(self, data=None):
+        if self.control._identity is None and data is None:
+            self.steps.append('GET')
+        return self.control.get_identity(data)
+
+    @staticmethod
+    def _rule_num(item):
+        try:
+            return int(item.get('ObjName', '').split('.')[-2])
+        except (IndexError, ValueError):
+            return None
+
+    def _get_snapshot(self, object_path):
+        if object_path not in self._snapshot:
+            data = self.control.get_request(object_path)
+            if object_path == URL_FILTER_OBJECT:
+                # Copy the rule list so simulated writes never touch the snapshot
+                data = dict(data, Objects=list(data.get('Objects', [])))
+                for item in data['Objects']:
+                    rule_num = self._rule_num(item)
+                    if rule_num is not None:
+                        self._next_rule_num = max(self._next_rule_num, rule_num + 1)
+            self._snapshot[object_path] = data
+        return self._snapshot[object_path]
+
+    def get_request(self, object_path, use_cache=True):
+        if not (use_cache and object_path in self._cached):
+            self.steps.append('GET')
+            if self.control.cache_reads:
+                self._cached.add(object_path)
+        return self._get_snapshot(object_path)
+
+    def run_reads(self, *calls):
+        return [call() for call in calls]
+
+    def get_many(self, object_paths):
+        return {path: self.get_request(path) for path in dict.fromkeys(object_paths)}
+
+    def set_request(self, payload, **kwargs):
+        self.steps.append('SET')
+        self._cached.clear()
+        table = self._get_snapshot(URL_FILTER_OBJECT)['Objects']
+
+        if payload.get('Operation') == 'Add':
+            rule_num = self._next_rule_num
+            self._next_rule_num += 1
+            table.append({
+                'ObjName': f"{URL_FILTER_OBJECT}.Rule.{rule_num}.",
+                'Param': [
+                    {'ParamName': 'URL', 'ParamValue': payload['URL']},
+                    {'ParamName': 'MACAddress', 'ParamValue': payload['MACAddress']},
+                ],
+            })
+            url = unquote(payload['URL']).replace('http://', '')
+            self.actions.append(f"ADD     '{url}' for {payload['MACAddress'] or 'All LAN Devices'}")
+
+        elif payload.get('Operation') == 'Del':
+            rule_num = payload['Object'].split('.')[-2]
+            rules = URLBlockingFeature.parse_rules({'Objects': table})
+            target = next((r for r in rules if r['rule_num'] == rule_num), None)
+            if target and not self.ghost_store.is_empty() and \
+               self.ghost_store.contains(self.control.get_identity()[1], target):
+                # Known ghosts are expected to survive the delete.
+                self.actions.append(f"PROBE   Rule #{rule_num} (known ghost, expected to fail)")
+            else:
+                self.actions.append(f"DELETE  Rule #{rule_num}")
+                table[:] = [item for item in table if str(self._rule_num(item)) != rule_num]
+        return True
+
+def print_plan(control, ghost_store, run, history=None):
+    """
+    Plans a URL blocking action against a single snapshot, without writing
+    anything, and prints the request counts and an estimated wall time.
+    run: callable that performs the action on the URLBlockingFeature it is given.
+    history: the session's DeviceHistoryStore, if any. Offline devices are
+    resolved from it as in a real run, but no snapshot is recorded.
+    """
+    dry_control = DryRunControl(control, ghost_store.copy())
+    device_feature = DeviceListingFeature(dry_control, history=history.read_only() if history else None)
+    url_feature = URLBlockingFeature(dry_control, device_feature, ghost_store=dry_control.ghost_store)
+
+    print("Planning against a snapshot of the modem (nothing will be written)...")
+    transcript = io.StringIO()
+    with contextlib.redirect_stdout(transcript):
+        run(url_feature)
+
+    if control.debug:
+        print("--- Simulated Run ---", file=sys.stderr)
+        print(transcript.getvalue().rstrip(), file=sys.stderr)
+        print("--- End Simulated Run ---\n", file=sys.stderr)
+
+    steps = dry_control.steps
+    reads = steps.count('GET')
+    writes = steps.count('SET')
+    pauses = sum(step for step in steps if isinstance(step, (int, float)))
+    latency = control.measured_latency()
+
+    print("\nPlanned changes:")
+    if dry_control.actions:
+        for action in dry_control.actions:
+            print(f"  {action}")
+    else:
+        print("  None. The modem is already in the requested state.")
+
+    print(f"\n{'Reads (GET)':<22} {reads}")
+    print(f"{'Writes (SET)':<22} {writes}")
+    print(f"{'Rate limit':<22} {control.min_interval:.1f}s between requests")
+    print(f"{'Write delay':<22} {DEFAULT_POST_WRITE_DELAY:.1f}s after each write")
+    if pauses:
+        print(f"{'Extra pauses':<22} {utils.format_duration(pauses)}")
+    if latency is None:
+        print(f"{'Latency':<22} not measured (assuming 0s)")
+    else:
+        print(f"{'Latency':<22} {latency:.2f}s per request (measured over {control.latency_count} requests)")
+    print(f"{'Estimated wall time':<22} {utils.format_duration(control.estimate_duration(steps, latency or 0.0))}")
@@ -0,0 +1,197 @@
+# MIT License
+#
+# Copyright (c) [Year] [Your Name or Handle]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import re
+import json
+import time
+import base64
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+CASSETTE_VERSION = 1
+REDACTED = "REDACTED"
+REDACTED_FIELDS = {'username', 'password'}
+
+class HTTPTransport:
+    """Sends requests to the modem through a real requests.Session."""
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.verify = False
+        self.headers = self.session.headers
+        self.cookies = self.session.cookies
+
+        requests.packages.urllib3.disable_warnings(
+            requests.packages.urllib3.exceptions.InsecureRequestWarning
+        )
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def time(self):
+        return time.time()
+
+    def close(self):
+        self.session.close()
+
+def _redact(data):
+    if not isinstance(data, dict):
+        return data
+    return {k: (REDACTED if k.lower() in REDACTED_FIELDS else v) for k, v in data.items()}
+
+def _redact_headers(headers):
+    """Keeps response headers but blanks out cookie values."""
+    redacted = {}
+    for name, value in headers.items():
+        if name.lower() == 'set-cookie':
+            value = re.sub(r'(^|,\s*)([^=;,\s]+)=[^;,]*', rf'\1\2={REDACTED}', value)
+        redacted[name] = value
+    return redacted
+
+def _interaction_key(method, url, params=None, data=None, files=None):
+    """Identifies a request independently of host, credentials and file contents."""
+    return json.dumps({
+        'method': method.upper(),
+        'path': urlsplit(url).path,
+        'params': params or {},
+        'data': _redact(data) or {},
+        'files': sorted((files or {}).keys()),
+    }, sort_keys=True)
+
+class RecordingTransport:
+    """
+    Wraps another transport and records every exchange to a cassette file.
+    Credentials and cookie values are redacted before anything is written.
+    """
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self.headers = inner.headers
+        self.cookies = inner.cookies
+        self.interactions = [] # list.append is atomic, so concurrent reads are safe
+
+    def request(self, method, url, **kwargs):
+        entry = json.loads(_interaction_key(method, url, kwargs.get('params'), kwargs.get('data'), kwargs.get('files')))
+        started = time.time()
+        try:
+            response = self.inner.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            entry['latency'] = time.time() - started
+            entry['error'] = str(e)
+            self.interactions.append(entry)
+            raise
+
+        entry['latency'] = time.time() - started
+        entry['status'] = response.status_code
+        entry['headers'] = _redact_headers(response.headers)
+        try:
+            entry['text'] = response.content.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['base64'] = base64.b64encode(response.content).decode('ascii')
+        self.interactions.append(entry)
+        return response
+
+    def sleep(self, seconds):
+        self.inner.sleep(seconds)
+
+    def time(self):
+        return self.inner.time()
+
+    def close(self):
+        with open(self.path, 'w') as f:
+            json.dump({'version': CASSETTE_VERSION, 'interactions': self.interactions}, f, indent=1)
+        self.inner.close()
+
+class ReplayTransport:
+    """
+    Serves responses from a cassette instead of the modem.
+    Matching requests are answered in recorded order; once a request's
+    recordings are used up, its last response is repeated (so polling loops
+    keep working). Recorded latency and every sleep are multiplied by 'scale',
+    so the default of 0 replays a whole session on CPU time alone.
+    """
+    def __init__(self, path, scale=0.0):
+        self.scale = scale
+        self.headers = CaseInsensitiveDict()
+        self.cookies = {}
+        self._queues = {}
+        self._last = {}
+        self._lock = threading.Lock() # Concurrent reads share the queues
+
+        with open(path, 'r') as f:
+            cassette = json.load(f)
+        if cassette.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version in '{path}'.")
+
+        for entry in cassette.get('interactions', []):
+            key = _interaction_key(entry['method'], entry['path'], entry['params'], entry['data'], dict.fromkeys(entry['files']))
+            self._queues.setdefault(key, []).append(entry)
+
+    def _build_response(self, entry, url):
+        response = requests.models.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+        response.url = url
+        response.encoding = 'utf-8'
+        if 'base64' in entry:
+            response._content = base64.b64decode(entry['base64'])
+        else:
+            response._content = entry.get('text', '').encode('utf-8')
+        response._content_consumed = True
+
+        cookie_header = response.headers.get('Set-Cookie', '')
+        for name in re.findall(r'(?:^|,\s*)([^=;,\s]+)=', cookie_header):
+            self.cookies[name] = REDACTED
+        return response
+
+    def request(self, method, url, **kwargs):
+        key = _interaction_key(method, url, kwargs.get('params'), kwargs.get('data'), kwargs.get('files'))
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue:
+                entry = queue.pop(0)
+                self._last[key] = entry
+            else:
+                entry = self._last.get(key)
+        if entry is None:
+            raise requests.exceptions.ConnectionError(f"No recorded response for {method} {urlsplit(url).path} {kwargs.get('params') or ''}")
+
+        self.sleep(entry.get('latency', 0.0))
+        if 'error' in entry:
+            raise requests.exceptions.ConnectionError(entry['error'])
+        return self._build_response(entry, url)
+
+    def sleep(self, seconds):
+        if self.scale > 0 and seconds > 0:
+            time.sleep(seconds * self.scale)
+
+    def time(self):
+        return time.time()
+
+    def close(self):
+        pass
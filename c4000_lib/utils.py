@@ -52,6 +52,17 @@ def get_default_gateway():
     print(f"Warning: All gateway detection methods failed. Using hardcoded fallback: {FALLBACK_MODEM_IP}", file=sys.stderr)
     return FALLBACK_MODEM_IP
 
+def format_duration(seconds):
+    """Formats a duration in seconds as e.g. '45s', '3m 05s' or '1h 02m'."""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
+
 def load_credentials(creds_file="c4000_control.creds"):
     """Loads credentials from ENV, a file, or prompts the user."""
     username = os.getenv("USERNAME")